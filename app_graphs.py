@@ -1,13 +1,40 @@
 import dash
 import pandas as pd
-from dash.dependencies import Input, Output, State
+from dash.dependencies import ClientsideFunction, Input, Output, State
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
 import numpy
+import collections
+import functools
+import itertools
+import json
+import os
+
+import clientside
+import dataset
+import figure_cache
+import figures
+import index
+import metrics
+import profiling
+import refresh
+import responses
+import schema
+import store
+
+class Deferred:
+    """A module imported by `load` on first attribute access. plotly.express
+    alone adds ~0.2 s to every worker's startup otherwise."""
+
+    def __init__(self, load):
+        self.load = load
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+px = Deferred(figures.express)
 
 csv_files = ['tamano_hogar',
              'mujeres_labor_hogar_AG_quintiles',
@@ -23,98 +50,64 @@ csv_files = ['tamano_hogar',
              'asistencia_escolar_quintil',
              'acceso_electricidad_quintil']
 
-data_frames = {name: pd.read_csv('{}.csv'.format(name)) for name in csv_files}
-data_frame = data_frames['tamano_hogar']
-pais_iso_df = data_frames['tasa_de_participacion_economica']
-pais_iso = {pais : iso for pais,iso in zip(pais_iso_df['País'].unique(),pais_iso_df['iso3'].unique())}
-pais_iso['América Latina (promedio ponderado)']='AL (pd)'
-pais_iso['América Latina (promedio simple)']='AL (ps)'
-
-# HTML Button styles
-white_button = {'background-color': 'white',
-                'color': 'black',
-                'height': '50px',
-                'width': '150px',
-                'margin-top': '50px',
-                'margin-left': '50px'}
-
-red_button = {'background-color': 'red',
-              'color': 'white',
-              'height': '50px',
-              'width': '150px',
-              'margin-top': '50px',
-              'margin-left': '50px'}
+def unit(data):
+    # " (Número de personas)", when the indicator's CEPALSTAT export gives its unit
+    unidad = served.data.describe(data).get('unidad')
+    return ' ({})'.format(unidad) if unidad else ''
 
 def time_series_quintil(data, country, area_g, indicador):
-    df = data_frames[data]
-    df["valor"] = df["valor"].astype(dtype='float64')
     varright = {"Tamaño medio del hogar": [": Tamaño hogar", "Tamaño hogar"],
                 "Mujeres con dedicación al hogar": ["Mujeres \ Hogar: ", "Porcentaje"]}
 
     if area_g == 'Área geográfica':
-        q = df[
-            (df["País"] == country) &
-            (df["Quintil"] == "Total quintiles")
-            ]
+        q = index.slice(data, pais=country, quintil="Total quintiles")
 
-        q["Años"] = q["Años"].astype(dtype='intc')
-
-        lfig = px.line(q,
-                       x="Años",
-                       y='valor',
-                       color='Área geográfica',
-                       labels={'valor': varright[indicador][1]})
+        lfig = figures.line(schema.plain(q),
+                            x="Años",
+                            y='valor',
+                            color='Área geográfica',
+                            labels={'valor': varright[indicador][1]})
 
     else:
-        q = df[
-            (df["País"] == country) &
-            (df["Área geográfica"] == "Nacional")
-            ]
+        q = index.slice(data, pais=country, area="Nacional")
 
-        q["Años"] = q["Años"].astype(dtype='intc')
-
-        lfig = px.line(q,
-                       x="Años",
-                       y='valor',
-                       color='Quintil',
-                       labels={'valor': varright[indicador][1]})
+        lfig = figures.line(schema.plain(q),
+                            x="Años",
+                            y='valor',
+                            color='Quintil',
+                            labels={'valor': varright[indicador][1]})
 
-    lfig.update_layout(title_text=country + " - " + indicador,
+    lfig.update_layout(title_text=country + " - " + indicador + unit(data),
                        legend_title="Desagregación",
                        xaxis=dict(
                            tickmode='linear',
-                           tick0=df["Años"].min(),
+                           tick0=index.values(data, "Años").min(),
                            dtick=1
                        ))
     lfig.update_traces(mode='lines+markers')
     return lfig
 
 def side_stacked_bars(data, country, dim):
-    # Filter pandas data_frame
-    data_frame = data_frames[data]
-    filt_cty = data_frame[(data_frame['País'] == country)].copy(deep=True)
-    filt_cty['Años'] = filt_cty['Años'].astype(dtype='intc')
-    filt_cty['valor'] = filt_cty['valor'].astype(dtype='float64')
-
-    # Get latest year of available data and filter by it
-    l_year = filt_cty['Años'].max()
+    # Rows of the latest year with data for each country (see views.py)
+    latest = data + '_ultimo_anio'
+    c_years = index.values(latest, 'Años', pais=country)
+    l_year = c_years[0] if len(c_years) else numpy.nan
     aggregates = {'Área geográfica': 'Total (15 años y más)',
                   'Grupo edad para participación en la PEA': 'Nacional',
                   'Quintil': 'Nacional'}
     aggregates2 = {'Área geográfica': 'Grupo edad para participación en la PEA',
                    'Grupo edad para participación en la PEA': 'Área geográfica',
                    'Quintil': 'Área geográfica'}
-    f_c_y = filt_cty[(filt_cty['Años'] == l_year) &
-                     (filt_cty[aggregates2[dim]] == aggregates[dim])]
+    f_c_y = index.slice(latest, pais=country, **{aggregates2[dim]: aggregates[dim]})
 
     xs = list(f_c_y[dim].unique())
 
     # Figure
-    fig = px.bar(f_c_y,
-                 x=dim,
-                 y='valor',
-                 color='Sexo',
-                 labels={'valor': 'Porcentaje'})
+    fig = figures.bar(schema.plain(f_c_y),
+                      x=dim,
+                      y='valor',
+                      color='Sexo',
+                      labels={'valor': 'Porcentaje'})
 
     fig.update_layout(title_text=country + ' ' + str(l_year) + ' - Tasa de participación económica',
                       barmode='group',
@@ -127,23 +120,16 @@ def side_stacked_bars(data, country, dim):
     return fig
 
 def sort_pais_bar(data, year):
-    # Select Data Frame
-    data_frame = data_frames[data].copy(deep=True)
-    data_frame['valor'] = data_frame['valor'].astype(dtype='float64')
-    data_frame['País (ISO)'] = data_frame['País'].apply(lambda x: pais_iso[x])
-
     # Filter data
-    filt_data = data_frame[(data_frame['Años'] == year) &
-                           (data_frame['Área geográfica'] == 'Nacional') &
-                           (data_frame['Escolaridad (EH)'] == 'Total')]
+    filt_data = schema.plain(index.slice(data, anio=year, area='Nacional', escolaridad='Total'))
 
     filt_data.sort_values(by='valor', inplace=True)
 
     # Figure
-    fig = px.bar(filt_data,
-                 x='País (ISO)',
-                 y='valor',
-                 labels={'valor': 'Relación Ingreso (M/H)'})
+    fig = figures.bar(filt_data,
+                      x='País (ISO)',
+                      y='valor',
+                      labels={'valor': 'Relación Ingreso (M/H)'})
 
     fig.update_layout(title_text=str(year) + ' - Relación del ingreso por sexo',
                       barmode='group',
@@ -157,22 +143,16 @@ def sort_pais_bar(data, year):
     return fig
 
 def sort_gini(area,year):
-    # Select Data Frame
-    data_frame = data_frames['gini'].copy(deep=True)
-    data_frame['valor'] = data_frame['valor'].astype(dtype='float64')
-    data_frame['País (ISO)'] = data_frame['País'].apply(lambda x: pais_iso[x])
-
     # Filter data
-    filt_data = data_frame[(data_frame['Años'] == year) &
-                           (data_frame['Área geográfica'] == area)]
+    filt_data = schema.plain(index.slice('gini', anio=year, area=area))
 
     filt_data.sort_values(by='valor', inplace=True)
 
     # Figure
-    fig = px.bar(filt_data,
-                 x='País (ISO)',
-                 y='valor',
-                 labels={'valor': 'Gini - '+str(year)})
+    fig = figures.bar(filt_data,
+                      x='País (ISO)',
+                      y='valor',
+                      labels={'valor': 'Gini - '+str(year)})
 
     fig.update_layout(title_text=str(year) + ' - Gini',
                       barmode='group')
@@ -180,24 +160,15 @@ def sort_gini(area,year):
     return fig
 
 def sidebside_bars(data, country, area):
-    # Select Data Frame
-    data_frame = data_frames[data].copy(deep=True)
-    data_frame['valor'] = data_frame['valor'].astype(dtype='float64')
-    data_frame['Años'] = data_frame['Años'].astype('str')
-    data_frame['Años observados'] = data_frame['Años'].apply(lambda x: x + "-M/H")
-
     # Filter data
-    years = ['2002', '2010', '2018']
-    filt_data = data_frame[(data_frame['Años'].isin(years)) &
-                           (data_frame['País'] == country) &
-                           (data_frame['Área geográfica'] == area)]
+    filt_data = schema.plain(index.slice(data + '_anios_observados', pais=country, area=area))
 
     # Figure
-    fig = px.bar(filt_data,
-                 x='Escolaridad (EH)',
-                 y='valor',
-                 color='Años observados',
-                 labels={'valor': 'Relación Ingreso (M/H)'})
+    fig = figures.bar(filt_data,
+                      x='Escolaridad (EH)',
+                      y='valor',
+                      color='Años observados',
+                      labels={'valor': 'Relación Ingreso (M/H)'})
 
     fig.update_layout(title_text=country + ' - Relación del ingreso por sexo',
                       barmode='group',
@@ -210,22 +181,18 @@ def sidebside_bars(data, country, area):
     return fig
 
 def stacked_bars(data, country):
-    # Select Data Frame
-    data_frame = data_frames[data].copy(deep=True)
-    data_frame['valor'] = data_frame['valor'].astype(dtype='float64')
-    data_frame['Años'] = data_frame['Años'].astype(dtype='intc')
-
     # Filter Data
-    filt_data = data_frame[(data_frame['Ocupados baja productividad'] == 'Total ocupados baja productividad') &
-                           (data_frame['País'] == country) &
-                           (data_frame['Sexo'] != 'Ambos sexos')]
+    filt_data = schema.plain(index.slice(data,
+                                         pais=country,
+                                         sexo=['Hombres', 'Mujeres'],
+                                         **{'Ocupados baja productividad': 'Total ocupados baja productividad'}))
 
     # Figure
-    fig = px.line(filt_data,
-                  x='Años',
-                  y='valor',
-                  color='Sexo',
-                  labels={'valor': 'Procentaje'})
+    fig = figures.line(filt_data,
+                       x='Años',
+                       y='valor',
+                       color='Sexo',
+                       labels={'valor': 'Procentaje'})
 
     fig.update_layout(title_text=country)
     fig.update_layout(title_text=country + ' - Ocupados en baja productividad (informales)',
@@ -241,27 +208,8 @@ def stacked_bars(data, country):
     return fig
 
 def clean_gini(area):
-    gini_df = data_frames['gini']
-    gini_df['Años'] = gini_df['Años'].astype(dtype='intc')
-    gini_df['valor'] = gini_df['valor'].astype(dtype='float64')
-    gini_df['País (ISO)'] = gini_df['País'].apply(lambda x: pais_iso[x])
-
-    gini_df = gini_df[(gini_df['Área geográfica'] == area)].sort_values(['País', 'Años'])
-
-    mn_gini = gini_df[gini_df.groupby('País').cumcount() == 0].rename(columns={'valor': 'Gini - Inicial',
-                                                                               'Años': 'Año - Inicial'})
-
-    gini_df = gini_df[(gini_df['Área geográfica'] == area)].sort_values(['País', 'Años'], ascending=[True, False])
-
-    mx_gini = gini_df[gini_df.groupby('País').cumcount() == 0].rename(columns={'valor': 'Gini - Final',
-                                                                               'Años': 'Año - Final'})
-    mx_gini['Gini - Inicial'] = list(mn_gini['Gini - Inicial'])
-    mx_gini['Año - Inicial'] = list(mn_gini['Año - Inicial'])
-
-    mx_gini['Desigualdad'] = numpy.where(mx_gini['Gini - Final'] >= mx_gini['Gini - Inicial'],
-                                         'Incremento en Desigualdad',
-                                         'Decremento en Desigualdad')
-    return mx_gini
+    # First/last year per country, precomputed in views.py
+    return schema.plain(index.slice('gini_inicial_final', area=area))
 
 def gini(area):
     # FIGURE
@@ -284,52 +232,29 @@ def gini(area):
 
     return figure
 
-def bars_lines(country, year, xdim_b, group_b):
-    # Filter Data
-    def filters_data(country, year, filt):
-        df = data_frames['asistencia_escolar_quintil']
-        df = df[(df['País'] == country) &
-                (df['Años'] == year) &
-                (df[filt[0]] == filt[1]) &
-                (df['Grandes grupos de edad'] == 'Total (7 a 24 años)')]
-        return df
-    if xdim_b == [white_button]*3 or group_b == [white_button]*3 or group_b==xdim_b:
+def bars_lines(country, year, x, group):
+    # x and group are two different dimensions of edu_selection; the third
+    # one is fixed to its total
+    totals = {'Sexo': 'Ambos sexos',
+              'Quintil': 'Total quintiles',
+              'Área geográfica': 'Nacional'}
+    if x not in totals or group not in totals or x == group:
         return {}
-    if xdim_b == [red_button, white_button, white_button] and group_b == [white_button, red_button, white_button]:
-        df = filters_data(country, year, ('Área geográfica', 'Nacional'))
-        x = 'Sexo'
-    elif xdim_b == [red_button, white_button, white_button] and group_b == [white_button, white_button, red_button]:
-        df = filters_data(country, year, ('Quintil', 'Total quintiles'))
-        x = 'Sexo'
-    elif xdim_b == [white_button, red_button, white_button] and group_b == [red_button, white_button, white_button]:
-        df = filters_data(country, year, ('Área geográfica', 'Nacional'))
-        x = 'Quintil'
-    elif xdim_b == [white_button, red_button, white_button] and group_b == [white_button, white_button, red_button]:
-        df = filters_data(country, year, ('Sexo', 'Ambos sexos'))
-        x = 'Quintil'
-    elif xdim_b == [white_button, white_button, red_button] and group_b == [red_button, white_button, white_button]:
-        df = filters_data(country, year, ('Quintil', 'Total quintiles'))
-        x = 'Área geográfica'
-    else:
-        df = filters_data(country, year, ('Sexo', 'Ambos sexos'))
-        x = 'Área geográfica'
+    fixed = next(dim for dim in totals if dim not in (x, group))
 
-    df['valor'] = df['valor'].astype(dtype='float64')
-
-    # Group bars
-    if group_b == [red_button, white_button, white_button]:
-        group = 'Sexo'
-    elif group_b == [white_button, red_button, white_button]:
-        group = 'Quintil'
-    else:
-        group = 'Área geográfica'
+    # Filter Data
+    df = index.slice('asistencia_escolar_quintil',
+                     pais=country,
+                     anio=year,
+                     **{fixed: totals[fixed],
+                        'Grandes grupos de edad': 'Total (7 a 24 años)'})
 
     # FIGURE
-    fig = px.bar(df,
-                 x=x,
-                 y='valor',
-                 color=group,
-                 labels={'valor': 'Procentaje'})
+    fig = figures.bar(schema.plain(df),
+                      x=x,
+                      y='valor',
+                      color=group,
+                      labels={'valor': 'Procentaje'})
     fig.update_layout(title_text='{} {} - Asistencia Escolar'.format(country, year),
                       barmode='group',
                       yaxis=dict(
@@ -340,23 +265,17 @@ def bars_lines(country, year, xdim_b, group_b):
     return fig
 
 def side_side_bars(data, country, year, title, x, color):
-    # Select Data Frame
-    data_frame = data_frames[data].copy(deep=True)
-    data_frame['valor'] = data_frame['valor'].astype(dtype='float64')
-    data_frame['Años'] = data_frame['Años'].astype(dtype='intc')
-
     # Filter data
-    filt_data = data_frame[(data_frame['Años'] == year) &
-                           (data_frame['País'] == country)]
+    filt_data = index.slice(data, anio=year, pais=country)
 
-    filt_data.sort_values('Quintil', inplace=True)
+    filt_data = filt_data.sort_values('Quintil')
 
     # Figure
-    fig = px.bar(filt_data,
-                 x=x,
-                 y='valor',
-                 color=color,
-                 labels={'valor': 'Porcentaje'})
+    fig = figures.bar(schema.plain(filt_data),
+                      x=x,
+                      y='valor',
+                      color=color,
+                      labels={'valor': 'Porcentaje'})
 
     fig.update_layout(title_text="{} {} - {}".format(country, year, title),
                       barmode='group',
@@ -368,107 +287,38 @@ def side_side_bars(data, country, year, title, x, color):
 
     return fig
 
-def points(data, year, initsort, sex_area, sa_dims):
-    # Data frame
-    df = data_frames[data].copy(deep=True)
-    df['Años'] = df['Años'].astype(dtype='intc')
-    df['valor'] = df['valor'].astype(dtype='float64')
-
-    # Filter
-    df_year = df[df['Años'] == year]
-
-    # Sorting
-    minyear = df['Años'].min()
-    ys = list(df[(df['Años'] == minyear) &
-                 (df[sex_area] == initsort)].sort_values(by=['valor'])['País'])
-    ysort = {y: i for i, y in enumerate(ys)}
-    counter = 0
-    initlen = int(len(ysort))
-    for elem in df_year['País'].unique():
-        if elem not in ysort:
-            ysort[elem] = initlen + counter
-            ys.append(elem)
-            counter += 1
-
-    # Figure
-    layout = go.Layout(
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        yaxis=dict(
-            showline=True,
-            gridcolor='lightgrey',
-            gridwidth=1,
-            linecolor='black',
-            linewidth=2
-        ),
-        xaxis=dict(
-            showline=True,
-            linecolor='black',
-            linewidth=2
-        )
-    )
-
-    fig = go.Figure(data=[
-        go.Scatter(name='{} {}'.format(sa, year),
-                   x=df[(df['Años'] == year) &
-                        (df[sex_area] == sa)].sort_values(by=['País'],
-                                                          axis=0,
-                                                          key=lambda x: pd.Series([ysort[y] for y in x]))['valor'],
-                   y=ys,
-                   mode='markers',
-                   marker=dict(size=8)
-                   ) for sa in sa_dims],
-        layout=layout
-    )
-    fig.update_xaxes(color='black')
-    return fig
-
 def time_series_mult_facet(data, countries, title, yleg):
-    # Data frame
-    df = data_frames[data].copy(deep=True)
-    df['Años'] = df['Años'].astype(dtype='intc')
-    df['valor'] = df['valor'].astype(dtype='float64')
-
     # Filter
-    df_country = df[(df['País'].isin(countries)) &
-                   (df['Sexo'].isin(['Hombres', 'Mujeres']))]
-
+    df_country = index.slice(data, pais=list(countries), sexo=['Hombres', 'Mujeres'])
 
     # Figure
-    fig = px.line(df_country,
-                  x='Años',
-                  y='valor',
-                  color='País',
-                  facet_col = 'Sexo',
-                  labels={'valor': yleg})
+    fig = figures.line(schema.plain(df_country),
+                       x='Años',
+                       y='valor',
+                       color='País',
+                       facet_col = 'Sexo',
+                       labels={'valor': yleg})
 
     fig.update_layout(title_text=title)
     fig.update_xaxes(tickangle=45)
     fig.update_traces(mode='lines+markers')
-    for i, elem in enumerate(fig.data):
-        fig.data[i].name = pais_iso[fig.data[i].name]
+    for trace in fig.data:
+        trace['name'] = served.pais_iso[trace['name']]
     return fig
 
 def time_series_mult(data, countries, area, title, yleg):
-    # Data frame
-    df = data_frames[data].copy(deep=True)
-    df['Años'] = df['Años'].astype(dtype='intc')
-    df['valor'] = df['valor'].astype(dtype='float64')
-
     # Filter
     try:
-        df_country = df[(df['País'].isin(countries)) &
-                        (df['Área geográfica'] == area)]
+        df_country = index.slice(data, pais=list(countries), area=area)
     except KeyError:
-        df_country = df[(df['País'].isin(countries)) &
-                        (df['Sexo'] == area)]
+        df_country = index.slice(data, pais=list(countries), sexo=area)
 
     # Figure
-    fig = px.line(df_country,
-                  x='Años',
-                  y='valor',
-                  color='País',
-                  labels={'valor': yleg})
+    fig = figures.line(schema.plain(df_country),
+                       x='Años',
+                       y='valor',
+                       color='País',
+                       labels={'valor': yleg})
 
     fig.update_layout(title_text=title,
                       xaxis=dict(
@@ -477,21 +327,38 @@ def time_series_mult(data, countries, area, title, yleg):
                       )
     fig.update_xaxes(tickangle=45)
     fig.update_traces(mode='lines+markers')
-    for i, elem in enumerate(fig.data):
-        fig.data[i].name = pais_iso[fig.data[i].name]
+    for trace in fig.data:
+        trace['name'] = served.pais_iso[trace['name']]
     return fig
 
 # User input
 desagregacion = ["Quintil", "Área geográfica"]
-paises = list(data_frame['País'].unique())
-
-# Desagregaciones
-anios = sorted(list(map(int, data_frame['Años'].unique())))
-anios_rim = sorted(list(map(int, data_frames['relacion_ingreso_medio_sexo']['Años'].unique())))
-anios_gini = sorted(list(map(int, data_frames['gini']['Años'].unique())))
 years = [2002, 2005, 2010, 2014, 2019]
-quintiles = list(data_frame["Quintil"].unique())
-area = list(data_frame["Área geográfica"].unique())
+
+# Selector buttons of edu_graph: x axis dimension, then bar grouping, each
+# row in the order of the dimensions in assets/clientside.js
+edu_buttons = ['button_sexo', 'button_quintil', 'button_area',
+               'button_sexo2', 'button_quintil2', 'button_area2']
+
+# What the layout and callbacks read of the dataset served, published as one
+# object so that a callback never mixes two datasets
+Served = collections.namedtuple('Served', ['data', 'version', 'pais_iso', 'paises', 'anios',
+                                           'anios_rim', 'anios_gini', 'quintiles', 'area'])
+
+def use_dataset(ds):
+    """Serve `ds`. Refreshes call it under figure_responses.swap.swapping()."""
+    global served
+    served = Served(data=ds, version=ds.version, pais_iso=ds.pais_iso,
+                    paises=list(ds.values('tamano_hogar', 'País')),
+                    # Desagregaciones
+                    anios=sorted(list(map(int, ds.values('tamano_hogar', 'Años')))),
+                    anios_rim=sorted(list(map(int, ds.values('relacion_ingreso_medio_sexo', 'Años')))),
+                    anios_gini=sorted(list(map(int, ds.values('gini', 'Años')))),
+                    quintiles=list(ds.values('tamano_hogar', 'Quintil')),
+                    area=list(ds.values('tamano_hogar', 'Área geográfica')))
+    dataset.activate(ds)
+
+use_dataset(dataset.load(csv_files))
 
 external_stylesheets = [dbc.themes.BOOTSTRAP]
 
@@ -713,233 +580,347 @@ def single_column_layout(multi1=False,multi2=False,offset=2,size=8,**kwargs):
         ])
 
 # App Layout
-app = dash.Dash(external_stylesheets=external_stylesheets)
+# No callback runs for its inputs' initial values: the figures of a section
+# come with it (build_section), and a tab only loads when it is chosen
+app = dash.Dash(external_stylesheets=external_stylesheets, prevent_initial_callbacks=True)
 
 server = app.server
+metrics.instrument(app)
+
+def clientside_store(graph, payloads=True):
+    # Rows of a chart drawn in the browser (see clientside.py)
+    if not clientside.ENABLED:
+        return []
+    if not payloads:
+        return [dcc.Store(id=graph + '_data')]
+    if graph == 'vic':
+        rows = index.slice('tasa_victimizacion', sexo=['Hombres', 'Mujeres'])
+        return [dcc.Store(id='vic_data', data=clientside.lines(
+                    rows, victim(list(served.data.values('tasa_victimizacion', 'País'))), color='País', facet='Sexo',
+                    labels={'valor': 'Porcentaje'}, names=served.pais_iso))]
+    rows = served.data['relacion_quintil_5_1']
+    return [dcc.Store(id='51_data', data=clientside.lines(
+                rows, quintil51(list(served.data.values('relacion_quintil_5_1', 'País')), 'Nacional'), color='País',
+                filters=['Área geográfica'], labels={'valor': 'Quintil 5 / Quintil 1'}, names=served.pais_iso, ticks=True))]
+
+# Dropdown options and slider ranges come from the data, so sections are
+# built per dataset version. Each is a tab; only the shown one is in the page
+def gini_section(payloads=True):
+    return [
+        # COEFICIENTE DE GINI
+        single_column_layout(title='Coeficiente de Gini',
+                             title2='Línea 45 grados',
+                             id_dropdown1='gini_input_area',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                served.data.values('gini', 'Área geográfica')],
+                             dropdown_placeholder1='Seleccionar área geográfica',
+                             id_graph='gini_graph'),
+
+        single_column_layout(title='',
+                             title2='Barras Ordenadas',
+                             id_dropdown1='gini_input_a',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                served.data.values('gini', 'Área geográfica')],
+                             dropdown_placeholder1='Seleccionar área geográfica',
+                             id_dropdown2='gini_input_y',
+                             dropdown_options2=[{'label': c, 'value': c} for c in served.anios_gini],
+                             dropdown_placeholder2='Seleccionar Año',
+                             id_graph='gini_bars')
+    ]
+
+def hogar_section(payloads=True):
+    return [
+        # TAMANO MEDIO HOGARES
+        two_column_layout_4place(title='Tamaño medio de los hogares',
+                          title_graph1='Barras Agrupadas',
+                          title_graph2='Serie de Tiempo',
+                          id_dropdown1='input_country',
+                          dropdown_options1=[{'label': c, 'value': c} for c in served.paises],
+                          dropdown_placeholder1='Seleccionar País o Región',
+                          id_dropdown2='input_dim',
+                          dropdown_options2=[{'label': c, 'value': c} for c in desagregacion],
+                          dropdown_placeholder2='Seleccionar desagregación',
+                          id_dropdown3='input_country_line',
+                          dropdown_options3=[{'label': c, 'value': c} for c in served.paises],
+                          dropdown_placeholder3='Seleccionar País o Región',
+                          id_dropdown4='input_geog_area',
+                          dropdown_placeholder4='Seleccionar desagregación',
+                          dropdown_options4=[{'label': c, 'value': c} for c in ['Área geográfica','Quintil']],
+                          id_graph1='Graph',
+                          id_graph2='Graph_line'),
+
+        # MUJERES LABOR HOGAR
+        single_column_layout(title='Mujeres con dedicación exclusivas a las labores del hogar, por quintil y área',
+                             title2='Serie de Tiempo',
+                             id_dropdown1='mh_input_country',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                served.data.values('mujeres_labor_hogar_AG_quintiles', 'País')],
+                             dropdown_placeholder1='Seleccionar País o Región',
+                             id_dropdown2='mh_input_dim',
+                             dropdown_options2=[{'label': c, 'value': c} for c in desagregacion],
+                             dropdown_placeholder2='Seleccionar desagregación',
+                             id_graph='mujeres_lh_ts')
+    ]
+
+def pea_section(payloads=True):
+    return [
+        # PARTICIPACION ECONOMICA
+        single_column_layout(
+            title='Tasa de participación económica de la población, por grupos de edad, sexo y área geográfica',
+            title2='Barras lado a lado',
+            id_dropdown1='tpe_input_dim',
+            dropdown_options1=[{'label': c, 'value': c} for c in
+                               served.data.values('tasa_de_participacion_economica', 'País')],
+            dropdown_placeholder1='Seleccionar País o Región',
+            id_dropdown2='tpe_input_aqe',
+            dropdown_options2=[{'label': c, 'value': c} for c in ['Área geográfica',
+                                                                  'Grupo edad para participación en la PEA',
+                                                                  'Quintil']],
+            dropdown_placeholder2='Seleccionar dimensión de desagregación',
+            id_graph='tpe_graph')
+    ]
+
+def ingreso_section(payloads=True):
+    return [
+        # RELACION INGRESO MEDIO
+        two_column_layout(title='Relacion del ingreso medio entre los sexos por años de educación y área geográfica',
+                          title_graph1='Serie de Tiempo',
+                          title_graph2='Barras lado a lado',
+                          id_dropdown1='rims2_input_cty',
+                          dropdown_options1=[{'label': c, 'value': c} for c in
+                                             served.data.values('relacion_ingreso_medio_sexo', 'País')],
+                          dropdown_placeholder1='Seleccionar País o Región',
+                          id_dropdown2='rims2_input_ag',
+                          dropdown_options2=[{'label': c, 'value': c} for c in
+                                             served.data.values('relacion_ingreso_medio_sexo', 'Área geográfica')],
+                          dropdown_placeholder2='Seleccionar área geográfica',
+                          id_dropdown3='rims_input_dim',
+                          dropdown_options3=[{'label': c, 'value': c} for c in served.anios_rim],
+                          dropdown_placeholder3='Seleccionar Año',
+                          id_graph1='rims2_graph',
+                          id_graph2='rims_graph')
+    ]
+
+def informales_section(payloads=True):
+    return [
+        # OCUPADOS URBANOS INFORMALES
+        single_column_layout(title='Ocupados urbanos en sectores de baja productividad (informales), por sexo',
+                             title2='Barras ordenadas',
+                             id_dropdown1='oui_input_cty',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                served.data.values('ocupados_informal_sexo', 'País')],
+                             dropdown_placeholder1='Seleccionar País o Región',
+                             id_graph='oui_graph')
+    ]
+
+def escolaridad_section(payloads=True):
+    return [
+        # ASISTENCIA ESCOLAR
+        html.Div(children=[
 
-app.layout = html.Div(children=[
-    html.H1('Indicadores Muestra'),
-
-    # COEFICIENTE DE GINI
-    single_column_layout(title='Coeficiente de Gini',
-                         title2='Línea 45 grados',
-                         id_dropdown1='gini_input_area',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            data_frames['gini']['Área geográfica'].unique()],
-                         dropdown_placeholder1='Seleccionar área geográfica',
-                         id_graph='gini_graph'),
-
-    single_column_layout(title='',
-                         title2='Barras Ordenadas',
-                         id_dropdown1='gini_input_a',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            data_frames['gini']['Área geográfica'].unique()],
-                         dropdown_placeholder1='Seleccionar área geográfica',
-                         id_dropdown2='gini_input_y',
-                         dropdown_options2=[{'label': c, 'value': c} for c in anios_gini],
-                         dropdown_placeholder2='Seleccionar Año',
-                         id_graph='gini_bars'),
-
-    # TAMANO MEDIO HOGARES
-    two_column_layout_4place(title='Tamaño medio de los hogares',
-                      title_graph1='Barras Agrupadas',
-                      title_graph2='Serie de Tiempo',
-                      id_dropdown1='input_country',
-                      dropdown_options1=[{'label': c, 'value': c} for c in paises],
-                      dropdown_placeholder1='Seleccionar País o Región',
-                      id_dropdown2='input_dim',
-                      dropdown_options2=[{'label': c, 'value': c} for c in desagregacion],
-                      dropdown_placeholder2='Seleccionar desagregación',
-                      id_dropdown3='input_country_line',
-                      dropdown_options3=[{'label': c, 'value': c} for c in paises],
-                      dropdown_placeholder3='Seleccionar País o Región',
-                      id_dropdown4='input_geog_area',
-                      dropdown_placeholder4='Seleccionar desagregación',
-                      dropdown_options4=[{'label': c, 'value': c} for c in ['Área geográfica','Quintil']],
-                      id_graph1='Graph',
-                      id_graph2='Graph_line'),
-
-    # MUJERES LABOR HOGAR
-    single_column_layout(title='Mujeres con dedicación exclusivas a las labores del hogar, por quintil y área',
-                         title2='Serie de Tiempo',
-                         id_dropdown1='mh_input_country',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            data_frames['mujeres_labor_hogar_AG_quintiles']['País'].unique()],
-                         dropdown_placeholder1='Seleccionar País o Región',
-                         id_dropdown2='mh_input_dim',
-                         dropdown_options2=[{'label': c, 'value': c} for c in desagregacion],
-                         dropdown_placeholder2='Seleccionar desagregación',
-                         id_graph='mujeres_lh_ts'),
-
-    # PARTICIPACION ECONOMICA
-    single_column_layout(
-        title='Tasa de participación económica de la población, por grupos de edad, sexo y área geográfica',
-        title2='Barras lado a lado',
-        id_dropdown1='tpe_input_dim',
-        dropdown_options1=[{'label': c, 'value': c} for c in
-                           data_frames['tasa_de_participacion_economica']['País'].unique()],
-        dropdown_placeholder1='Seleccionar País o Región',
-        id_dropdown2='tpe_input_aqe',
-        dropdown_options2=[{'label': c, 'value': c} for c in ['Área geográfica',
-                                                              'Grupo edad para participación en la PEA',
-                                                              'Quintil']],
-        dropdown_placeholder2='Seleccionar dimensión de desagregación',
-        id_graph='tpe_graph'),
-
-    # RELACION INGRESO MEDIO
-    two_column_layout(title='Relacion del ingreso medio entre los sexos por años de educación y área geográfica',
-                      title_graph1='Serie de Tiempo',
-                      title_graph2='Barras lado a lado',
-                      id_dropdown1='rims2_input_cty',
-                      dropdown_options1=[{'label': c, 'value': c} for c in
-                                         data_frames['relacion_ingreso_medio_sexo']['País'].unique()],
-                      dropdown_placeholder1='Seleccionar País o Región',
-                      id_dropdown2='rims2_input_ag',
-                      dropdown_options2=[{'label': c, 'value': c} for c in
-                                         data_frames['relacion_ingreso_medio_sexo']['Área geográfica'].unique()],
-                      dropdown_placeholder2='Seleccionar área geográfica',
-                      id_dropdown3='rims_input_dim',
-                      dropdown_options3=[{'label': c, 'value': c} for c in anios_rim],
-                      dropdown_placeholder3='Seleccionar Año',
-                      id_graph1='rims2_graph',
-                      id_graph2='rims_graph'),
-
-    # OCUPADOS URBANOS INFORMALES
-    single_column_layout(title='Ocupados urbanos en sectores de baja productividad (informales), por sexo',
-                         title2='Barras ordenadas',
-                         id_dropdown1='oui_input_cty',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            data_frames['ocupados_informal_sexo']['País'].unique()],
-                         dropdown_placeholder1='Seleccionar País o Región',
-                         id_graph='oui_graph'),
-
-    # ASISTENCIA ESCOLAR
-    html.Div(children=[
+            dbc.Row([
+                html.H2('Asistencia Escolar (7 a 24 años), por sexo, quintil y área geográfica')
+            ],
+                justify='center'
+            ),
 
-        dbc.Row([
-            html.H2('Asistencia Escolar (7 a 24 años), por sexo, quintil y área geográfica')
-        ],
-            justify='center'
-        ),
+            dbc.Row([
+                dbc.Col(html.Label('Seleccionar dimensión del eje horizontal'),
+                width={'offset': 2, 'size': 8})
+            ],
+                justify='start',
+                align='end'
+            ),
 
-        dbc.Row([
-            dbc.Col(html.Label('Seleccionar dimensión del eje horizontal'),
-            width={'offset': 2, 'size': 8})
-        ],
-            justify='start',
-            align='end'
-        ),
+            dbc.Row([
+                dbc.Col([
+                    html.Button('Sexo', id='button_sexo', n_clicks=0, className='selector'),
+                    html.Button('Quintil', id='button_quintil', n_clicks=0, className='selector'),
+                    html.Button('Área geográfica', id='button_area', n_clicks=0, className='selector')
+                ], width={'offset': 2, 'size': 8})],
+                justify='center',
+                align='start'
+            ),
 
-        dbc.Row([
-            dbc.Col([
-                html.Button('Sexo', id='button_sexo', n_clicks=0, style=white_button),
-                html.Button('Quintil', id='button_quintil', n_clicks=0, style=white_button),
-                html.Button('Área geográfica', id='button_area', n_clicks=0, style=white_button)
-            ], width={'offset': 2, 'size': 8})],
-            justify='center',
-            align='start'
-        ),
+            dbc.Row([
+                dbc.Col(html.Label('Seleccionar agrupación de barras'),
+                width={'offset': 2, 'size': 8})
+            ],
+                justify='start',
+                align='end'
+            ),
 
-        dbc.Row([
-            dbc.Col(html.Label('Seleccionar agrupación de barras'),
-            width={'offset': 2, 'size': 8})
-        ],
-            justify='start',
-            align='end'
-        ),
+            dbc.Row([
+                dbc.Col([
+                    html.Button('Sexo', id='button_sexo2', n_clicks=0, className='selector'),
+                    html.Button('Quintil', id='button_quintil2', n_clicks=0, className='selector'),
+                    html.Button('Área geográfica', id='button_area2', n_clicks=0, className='selector')
+                ], width={'offset': 2, 'size': 8})],
+                justify='center',
+                align='start'
+            ),
 
+            # Dimensions the buttons select: x axis and bar grouping
+            dcc.Store(id='edu_selection', data={'x': None, 'group': None}),
+        ]),
+
+        # POBLACION ADULTA ESCOLARIDAD
+        single_column_layout(title='',
+                             title2='Barras y línea',
+                             id_dropdown1='edu_input_cty',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                served.data.values('poblacion_adulta_escolaridad', 'País')],
+                             dropdown_placeholder1='Seleccionar País',
+                             id_dropdown2='edu_input_year',
+                             dropdown_options2=[{'label': c, 'value': c} for c in served.anios_gini],
+                             dropdown_placeholder2='Seleccionar año',
+                             id_graph='edu_graph')
+    ]
+
+def servicios_section(payloads=True):
+    return [
+        # SERVICIOS BASICOS HOGAR
+        single_column_layout(title='Hogares según disponibilidad de servicios básicos en la vivienda, por área geográfica',
+                             title2='Barras lado a lado',
+                             id_dropdown1='hog_input_cty',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                served.data.values('hogares_disponibilidad_servicios', 'País')],
+                             dropdown_placeholder1='Seleccionar País',
+                             id_graph='hog_graph'),
         dbc.Row([
             dbc.Col([
-                html.Button('Sexo', id='button_sexo2', n_clicks=0, style=white_button),
-                html.Button('Quintil', id='button_quintil2', n_clicks=0, style=white_button),
-                html.Button('Área geográfica', id='button_area2', n_clicks=0, style=white_button)
-            ], width={'offset': 2, 'size': 8})],
-            justify='center',
-            align='start'
-        ),
-    ]),
-
-    # POBLACION ADULTA ESCOLARIDAD
-    single_column_layout(title='',
-                         title2='Barras y línea',
-                         id_dropdown1='edu_input_cty',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            data_frames['poblacion_adulta_escolaridad']['País'].unique()],
-                         dropdown_placeholder1='Seleccionar País',
-                         id_dropdown2='edu_input_year',
-                         dropdown_options2=[{'label': c, 'value': c} for c in anios_gini],
-                         dropdown_placeholder2='Seleccionar año',
-                         id_graph='edu_graph'),
-
-    # SERVICIOS BASICOS HOGAR
-    single_column_layout(title='Hogares según disponibilidad de servicios básicos en la vivienda, por área geográfica',
-                         title2='Barras lado a lado',
-                         id_dropdown1='hog_input_cty',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            data_frames['hogares_disponibilidad_servicios']['País'].unique()],
-                         dropdown_placeholder1='Seleccionar País',
-                         id_graph='hog_graph'),
-    dbc.Row([
-        dbc.Col([
-            html.Label('Seleccionar un año'),
-            dcc.Slider(
-                id='slider_hog',
-                min=data_frames['hogares_disponibilidad_servicios']['Años'].astype(dtype='intc').min(),
-                max=data_frames['hogares_disponibilidad_servicios']['Años'].astype(dtype='intc').max(),
-                step=1,
-                marks={int(year) : str(year) for year in anios_rim+[2019]},
-                value=data_frames['hogares_disponibilidad_servicios']['Años'].astype(dtype='intc').min(),
-            )
-        ], width={'offset': 2, 'size': 8})
-    ]),
-
-    # ACCESO A ELECTRICIDAD
-    single_column_layout(title='Proporción de la población con acceso a electricidad, por área geográfica y quintil',
-                         title2='Barras lado a lado',
-                         id_dropdown1='elec_input_cty',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            sorted(list(data_frames['acceso_electricidad_quintil']['País'].unique()))],
-                         dropdown_placeholder1='Seleccionar País',
-                         id_graph='elec_graph'),
-    dbc.Row([
-        dbc.Col([
-            html.Label('Seleccionar un año'),
-            dcc.Slider(
-                id='slider_elec',
-                min=data_frames['acceso_electricidad_quintil']['Años'].astype(dtype='intc').min(),
-                max=data_frames['acceso_electricidad_quintil']['Años'].astype(dtype='intc').max(),
-                step=1,
-                marks={int(year): str(year) for year in anios_rim + [2019]},
-                value=data_frames['acceso_electricidad_quintil']['Años'].astype(dtype='intc').min(),
-            )
-        ], width={'offset': 2, 'size': 8})
-    ]),
-    # TASA DE VICTIMIZACION
-    single_column_layout(multi1=True,
-                         offset=1,
-                         size=10,
-                         title='Tasa de victimización, por sexo',
-                         title2='Serie de Tiempo',
-                         id_dropdown1='vic_input_cty',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            data_frames['tasa_victimizacion']['País'].unique()],
-                         dropdown_placeholder1='Seleccionar Países',
-                         id_graph='vic_graph'),
-
-    # RELACION DEL INGRESO MEDIO: QUINTIL 5/ QUINTIL 1
-    single_column_layout(multi1=True,
-                         title='Relación del ingreso medio per cápita del hogar: quintil 5 / quintil 1',
-                         title2='Serie de Tiempo',
-                         id_dropdown1='51_input_cty',
-                         dropdown_options1=[{'label': c, 'value': c} for c in
-                                            data_frames['relacion_quintil_5_1']['País'].unique()],
-                         dropdown_placeholder1='Seleccionar Países',
-                         id_dropdown2='51_input_area',
-                         dropdown_options2=[{'label': c, 'value': c} for c in
-                                            data_frames['relacion_quintil_5_1']['Área geográfica'].unique()],
-                         dropdown_placeholder2='Seleccionar área geográfica',
-                         id_graph='51_graph'),
-])
+                html.Label('Seleccionar un año'),
+                dcc.Slider(
+                    id='slider_hog',
+                    min=int(served.data.values('hogares_disponibilidad_servicios', 'Años').min()),
+                    max=int(served.data.values('hogares_disponibilidad_servicios', 'Años').max()),
+                    step=1,
+                    marks={int(year) : str(year) for year in served.anios_rim+[2019]},
+                    value=int(served.data.values('hogares_disponibilidad_servicios', 'Años').min()),
+                )
+            ], width={'offset': 2, 'size': 8})
+        ])
+    ]
+
+def electricidad_section(payloads=True):
+    return [
+        # ACCESO A ELECTRICIDAD
+        single_column_layout(title='Proporción de la población con acceso a electricidad, por área geográfica y quintil',
+                             title2='Barras lado a lado',
+                             id_dropdown1='elec_input_cty',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                sorted(list(served.data.values('acceso_electricidad_quintil', 'País')))],
+                             dropdown_placeholder1='Seleccionar País',
+                             id_graph='elec_graph'),
+        dbc.Row([
+            dbc.Col([
+                html.Label('Seleccionar un año'),
+                dcc.Slider(
+                    id='slider_elec',
+                    min=int(served.data.values('acceso_electricidad_quintil', 'Años').min()),
+                    max=int(served.data.values('acceso_electricidad_quintil', 'Años').max()),
+                    step=1,
+                    marks={int(year): str(year) for year in served.anios_rim + [2019]},
+                    value=int(served.data.values('acceso_electricidad_quintil', 'Años').min()),
+                )
+            ], width={'offset': 2, 'size': 8})
+        ])
+    ]
+
+def victimizacion_section(payloads=True):
+    return [
+        # TASA DE VICTIMIZACION
+        single_column_layout(multi1=True,
+                             offset=1,
+                             size=10,
+                             title='Tasa de victimización, por sexo',
+                             title2='Serie de Tiempo',
+                             id_dropdown1='vic_input_cty',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                served.data.values('tasa_victimizacion', 'País')],
+                             dropdown_placeholder1='Seleccionar Países',
+                             id_graph='vic_graph')
+    ] + clientside_store('vic', payloads)
+
+def quintiles_section(payloads=True):
+    return [
+        # RELACION DEL INGRESO MEDIO: QUINTIL 5/ QUINTIL 1
+        single_column_layout(multi1=True,
+                             title='Relación del ingreso medio per cápita del hogar: quintil 5 / quintil 1',
+                             title2='Serie de Tiempo',
+                             id_dropdown1='51_input_cty',
+                             dropdown_options1=[{'label': c, 'value': c} for c in
+                                                served.data.values('relacion_quintil_5_1', 'País')],
+                             dropdown_placeholder1='Seleccionar Países',
+                             id_dropdown2='51_input_area',
+                             dropdown_options2=[{'label': c, 'value': c} for c in
+                                                served.data.values('relacion_quintil_5_1', 'Área geográfica')],
+                             dropdown_placeholder2='Seleccionar área geográfica',
+                             id_graph='51_graph')
+    ] + clientside_store('51', payloads)
+
+sections = [('gini', 'Gini', gini_section),
+            ('hogar', 'Hogares', hogar_section),
+            ('pea', 'Participación económica', pea_section),
+            ('ingreso', 'Ingreso por sexo', ingreso_section),
+            ('informales', 'Informales', informales_section),
+            ('escolaridad', 'Escolaridad', escolaridad_section),
+            ('servicios', 'Servicios básicos', servicios_section),
+            ('electricidad', 'Electricidad', electricidad_section),
+            ('victimizacion', 'Victimización', victimizacion_section),
+            ('quintiles', 'Quintil 5 / 1', quintiles_section)]
+
+def initial_figures(components):
+    """Set the figure of every graph among `components` that a server
+    callback draws to its response for the inputs' initial values, from the
+    figure cache. The callbacks then need no initial call."""
+    found = {}
+    for component in components:
+        found.update((c.id, c) for c in [component] + list(component._traverse()) if getattr(c, 'id', None))
+    for callback_id, spec in app.callback_map.items():
+        graph_id, prop = callback_id.rsplit('.', 1)
+        if prop != 'figure' or graph_id not in found or 'callback' not in spec:
+            continue
+        args = [getattr(found.get(dep['id']), dep['property'], None)
+                for dep in spec['inputs'] + spec['state']]
+        try:
+            response = spec['callback'](*args, outputs_list=figure_cache.outputs_list(callback_id))
+        except Exception:
+            # PreventUpdate, or a chart that cannot draw: left empty, as the initial call left it
+            continue
+        found[graph_id].figure = json.loads(response)['response'][graph_id]['figure']
+
+@functools.lru_cache(maxsize=2 * len(sections))
+def build_section(name, version):
+    builder = {key: section for key, label, section in sections}[name]
+    components = builder()
+    initial_figures(components)
+    return html.Div(components)
+
+@functools.lru_cache(maxsize=1)
+def build_layout(version):
+    first = sections[0][0]
+    return html.Div(children=[
+        html.H1('Indicadores Muestra'),
+        dcc.Tabs(id='section_tabs', value=first,
+                 children=[dcc.Tab(label=label, value=name) for name, label, section in sections]),
+        html.Div(id='section', children=build_section(first, version))
+    ])
+
+# Dash checks callback ids against this: every section, without rows or figures
+app.validation_layout = html.Div([dcc.Tabs(id='section_tabs'), html.Div(id='section')] +
+                                 [html.Div(section(payloads=False)) for name, label, section in sections])
+def serve_layout():
+    with figure_responses.swap.serving():
+        return build_layout(served.version)
+
+app.layout = serve_layout
+
+@app.callback(
+    Output('section', 'children'),
+    Input('section_tabs', 'value'))
+def show_section(name):
+    return build_section(name, served.version)
 
 #Graph  : Ordered Bars - Gini
 @app.callback(
@@ -955,40 +936,28 @@ def update_ginibars(area, year):
     Input('input_country', 'value'),
     Input('input_dim', 'value'))
 def update_graph(country, dim):
-    # Convert datatypes
-    data_frame["Años"] = data_frame["Años"].astype(dtype='intc')
-    data_frame["valor"] = data_frame["valor"].astype(dtype='float64')
-
     # If user chooses 'Quintil'
     # Filter the dataframe by quintil and country
     if dim == 'Quintil':
 
-        filt = data_frame[
-            (data_frame["País"] == country) &
-            (data_frame["Área geográfica"] == "Nacional") &
-            (data_frame["Años"].isin(years))
-            ]
+        filt = {'pais': country, 'area': "Nacional"}
 
-        x_d = quintiles
+        x_d = served.quintiles
 
     else:
 
-        filt = data_frame[
-            (data_frame["País"] == country) &
-            (data_frame["Quintil"] == "Total quintiles") &
-            (data_frame["Años"].isin(years))
-            ]
+        filt = {'pais': country, 'quintil': "Total quintiles"}
 
-        x_d = area
+        x_d = served.area
 
     # The Figure
     fig = go.Figure(data=[
         go.Bar(name=str(year),
                x=x_d,
-               y=filt[data_frame["Años"] == year]['valor']) for year in years
+               y=index.slice('tamano_hogar', anio=year, **filt)['valor']) for year in years
     ])
 
-    fig.update_layout(title_text="{} - Tamaño Medio del Hogar".format(country),
+    fig.update_layout(title_text="{} - Tamaño Medio del Hogar{}".format(country, unit('tamano_hogar')),
                       barmode='group')
 
     return fig
@@ -1001,7 +970,8 @@ def update_graph(country, dim):
 def update_graph_line(country, dim):
     try:
         return time_series_quintil('tamano_hogar', country, dim, "Tamaño medio del hogar")
-    except (ValueError, KeyError, IndexError):
+    except (ValueError, KeyError, IndexError) as e:
+        metrics.swallowed(e)
         return {}
 
 # Graph 3 : Time Series - Mujeres con dedicacion hogar
@@ -1012,7 +982,8 @@ def update_graph_line(country, dim):
 def update_graph_line_mh(country, dim):
     try:
         return time_series_quintil('mujeres_labor_hogar_AG_quintiles', country, dim, "Mujeres con dedicación al hogar")
-    except (ValueError, KeyError):
+    except (ValueError, KeyError) as e:
+        metrics.swallowed(e)
         return {}
 
 #Graph 4 : Side stacked bars - Tasa de participacion economica
@@ -1025,16 +996,20 @@ def ug_bars(country, dim):
         try: return side_stacked_bars('tasa_de_participacion_economica_quintil',
                                       country,
                                      'Quintil')
-        except (TypeError, ValueError, KeyError): return side_stacked_bars('tasa_de_participacion_economica',
-                                                                 'América Latina (promedio simple)',
-                                                                 'Quintil')
+        except (TypeError, ValueError, KeyError) as e:
+            metrics.swallowed(e)
+            return side_stacked_bars('tasa_de_participacion_economica',
+                                     'América Latina (promedio simple)',
+                                     'Quintil')
     else:
         try: return side_stacked_bars('tasa_de_participacion_economica',
                                       country,
                                       dim)
-        except (TypeError, ValueError, KeyError): return side_stacked_bars('tasa_de_participacion_economica',
-                                                                 'América Latina (promedio simple)',
-                                                                 'Área geográfica')
+        except (TypeError, ValueError, KeyError) as e:
+            metrics.swallowed(e)
+            return side_stacked_bars('tasa_de_participacion_economica',
+                                     'América Latina (promedio simple)',
+                                     'Área geográfica')
 
 # Graph 5 : Ordered bars - relacion ingreso sexo
 @app.callback(
@@ -1043,8 +1018,9 @@ def ug_bars(country, dim):
 def order_bars(year):
     try:
         return sort_pais_bar('relacion_ingreso_medio_sexo', year)
-    except ValueError:
-        {}
+    except ValueError as e:
+        metrics.swallowed(e)
+        return {}
 
 # Graph 6 : Side by side bars - relacion ingreso sexo
 @app.callback(
@@ -1054,7 +1030,8 @@ def order_bars(year):
 def ss_bars(country, area):
     try:
         return sidebside_bars('relacion_ingreso_medio_sexo', country, area)
-    except (ValueError, KeyError):
+    except (ValueError, KeyError) as e:
+        metrics.swallowed(e)
         return {}
 
 #Graph 7 : Time series - Ocupados urbanos informales
@@ -1063,7 +1040,9 @@ def ss_bars(country, area):
         Input('oui_input_cty','value'))
 def stack_bars(country):
     try: return stacked_bars('ocupados_informal_sexo', country)
-    except (KeyError,ValueError): return {}
+    except (KeyError,ValueError) as e:
+        metrics.swallowed(e)
+        return {}
 
 #Graph 8 : Gini : 45 degree line
 @app.callback(
@@ -1071,126 +1050,32 @@ def stack_bars(country):
         Input('gini_input_area','value'))
 def c_gini(area):
     try: return gini(area)
-    except (ValueError,KeyError): return {}
-
-# BOTONES EJE HORIZONTAL
-@app.callback(
-    Output('button_sexo', 'style'),
-    Input('button_sexo', 'n_clicks'),
-    State('button_sexo', 'style'),
-    State('button_quintil', 'style'),
-    State('button_area', 'style'))
-def updatem(click, s1, s2, s3):
-    count = [1 for s in [s1, s2, s3] if s == red_button]
-    if click > 0:
-        if len(count) == 0:
-            return red_button
-        else:
-            return white_button
-    else:
-        return white_button
-
-@app.callback(
-    Output('button_quintil', 'style'),
-    Input('button_quintil', 'n_clicks'),
-    State('button_sexo', 'style'),
-    State('button_quintil', 'style'),
-    State('button_area', 'style'))
-def updatew(click, s1, s2, s3):
-    count = [1 for s in [s1, s2, s3] if s == red_button]
-    if click > 0:
-        if len(count) == 0:
-            return red_button
-        else:
-            return white_button
-    else:
-        return white_button
-
-@app.callback(
-    Output('button_area', 'style'),
-    Input('button_area', 'n_clicks'),
-    State('button_sexo', 'style'),
-    State('button_quintil', 'style'),
-    State('button_area', 'style'))
-def updatemr(click, s1, s2, s3):
-    count = [1 for s in [s1, s2, s3] if s == red_button]
-    if click > 0:
-        if len(count) == 0:
-            return red_button
-        else:
-            return white_button
-    else:
-        return white_button
-
-# BOTONES AGRUPACION BARRAS
-@app.callback(
-    Output('button_sexo2', 'style'),
-    Input('button_sexo2', 'n_clicks'),
-    State('button_sexo', 'style'),
-    State('button_sexo2', 'style'),
-    State('button_quintil2', 'style'),
-    State('button_area2', 'style'))
-def updates2(click, s1, s4, s5, s6):
-    count = [1 for s in [s4, s5, s6] if s == red_button]
-    if click > 0 and s1 == white_button:
-        if len(count) == 0:
-            return red_button
-        else:
-            return white_button
-    else:
-        return white_button
-
-@app.callback(
-    Output('button_quintil2', 'style'),
-    Input('button_quintil2', 'n_clicks'),
-    State('button_quintil', 'style'),
-    State('button_sexo2', 'style'),
-    State('button_quintil2', 'style'),
-    State('button_area2', 'style'))
-def updateq2(click, s2, s4, s5, s6):
-    count = [1 for s in [s4, s5, s6] if s == red_button]
-    if click > 0 and s2 == white_button:
-        if len(count) == 0:
-            return red_button
-        else:
-            return white_button
-    else:
-        return white_button
+    except (ValueError,KeyError) as e:
+        metrics.swallowed(e)
+        return {}
 
-@app.callback(
-    Output('button_area2', 'style'),
-    Input('button_area2', 'n_clicks'),
-    State('button_area', 'style'),
-    State('button_sexo2', 'style'),
-    State('button_quintil2', 'style'),
-    State('button_area2', 'style'))
-def updatea2(click, s3, s4, s5, s6):
-    count = [1 for s in [s4, s5, s6] if s == red_button]
-    if click > 0 and s3 == white_button:
-        if len(count) == 0:
-            return red_button
-        else:
-            return white_button
-    else:
-        return white_button
+# BOTONES EJE HORIZONTAL Y AGRUPACION BARRAS
+# One clientside state machine (assets/clientside.js): a click changes
+# edu_selection, and with it edu_graph, at most once
+app.clientside_callback(ClientsideFunction('cepal', 'selection'),
+                        [Output('edu_selection', 'data')] +
+                        [Output(button, 'className') for button in edu_buttons],
+                        [Input(button, 'n_clicks') for button in edu_buttons],
+                        [State('edu_selection', 'data')],
+                        prevent_initial_call=True)
 
 # Graph 9 : Asistencia Escolar
 @app.callback(
     Output('edu_graph', 'figure'),
     Input('edu_input_cty', 'value'),
     Input('edu_input_year', 'value'),
-    Input('button_sexo', 'style'),
-    Input('button_quintil', 'style'),
-    Input('button_area', 'style'),
-    Input('button_sexo2', 'style'),
-    Input('button_quintil2', 'style'),
-    Input('button_area2', 'style'))
-def edu_graph(c, y, b1, b2, b3, b4, b5, b6):
+    Input('edu_selection', 'data'))
+def edu_graph(c, y, selection):
     try:
-        xdim = [b1,b2,b3]
-        group = [b4,b5,b6]
-        return bars_lines(c, y, xdim, group)
-    except KeyError:
+        selection = selection or {}
+        return bars_lines(c, y, selection.get('x'), selection.get('group'))
+    except KeyError as e:
+        metrics.swallowed(e)
         return {}
 
 #Graph 10 : Hogares Servicios Vivienda
@@ -1205,7 +1090,9 @@ def hog_graph(country,year):
                                "Disponibilidad de Servicios",
                                'Servicios básicos_(EH)',
                                'Área geográfica')
-    except (KeyError,ValueError): return {}
+    except (KeyError,ValueError) as e:
+        metrics.swallowed(e)
+        return {}
 
 #Graph # : Hogares Electricidad
 @app.callback(
@@ -1219,29 +1106,159 @@ def elec_graph(country,year):
                                "Acceso a Electricidad",
                                'Quintil',
                                'Área geográfica')
-    except (KeyError,ValueError): return {}
+    except (KeyError,ValueError) as e:
+        metrics.swallowed(e)
+        return {}
 
 #Graph 11 : Tasa de victimizacion
-@app.callback(
-    Output('vic_graph','figure'),
-    [Input('vic_input_cty','value')])
 def victim(countries):
     try: return time_series_mult_facet('tasa_victimizacion',
                                         countries,
                                         "Tasa de victimización",
                                         "Porcentaje")
-    except (TypeError,ValueError,KeyError): return {}
+    except (TypeError,ValueError,KeyError) as e:
+        metrics.swallowed(e)
+        return {}
 
 #Graph 12 : Relacion quintil 5 y quintil 1.
-@app.callback(
-    Output('51_graph','figure'),
-    [Input('51_input_cty','value')],
-    Input('51_input_area', 'value'))
 def quintil51(countries, area):
     try: return time_series_mult('relacion_quintil_5_1', countries, area,
                                  'Relación Quintil de Ingreso: 5 y 1',
                                  "Quintil 5 / Quintil 1")
-    except (TypeError,ValueError,KeyError): return {}
+    except (TypeError,ValueError,KeyError) as e:
+        metrics.swallowed(e)
+        return {}
+
+# Multi-select charts: drawn in the browser from the rows in their dcc.Store,
+# or by the server with CEPAL_CLIENTSIDE=0
+if clientside.ENABLED:
+    app.clientside_callback(ClientsideFunction('cepal', 'lines'),
+                            Output('vic_graph', 'figure'),
+                            [Input('vic_input_cty', 'value')],
+                            [State('vic_data', 'data')],
+                            prevent_initial_call=False)
+    app.clientside_callback(ClientsideFunction('cepal', 'lines'),
+                            Output('51_graph', 'figure'),
+                            [Input('51_input_cty', 'value'), Input('51_input_area', 'value')],
+                            [State('51_data', 'data')],
+                            prevent_initial_call=False)
+else:
+    victim = app.callback(Output('vic_graph','figure'),
+                          [Input('vic_input_cty','value')])(victim)
+    quintil51 = app.callback(Output('51_graph','figure'),
+                             [Input('51_input_cty','value')],
+                             Input('51_input_area', 'value'))(quintil51)
+
+# Figure cache
+# CEPAL_WARM_CACHE=1 renders warm_domains() at import and after each refresh
+WARM_CACHE = os.environ.get('CEPAL_WARM_CACHE', '').strip() not in ('', '0')
+
+def warm_domains():
+    # Every dropdown/slider combination of the single-select charts
+    def uniques(data, col):
+        return list(served.data.values(data, col))
+
+    def year_range(data):
+        years = served.data.values(data, 'Años')
+        return range(int(years.min()), int(years.max()) + 1)
+
+    dims = ['Sexo', 'Quintil', 'Área geográfica']
+    selections = [{'x': x, 'group': g} for x in dims for g in dims if x != g]
+    gini_areas = uniques('gini', 'Área geográfica')
+    return {
+        'gini_graph.figure': [(a,) for a in gini_areas],
+        'gini_bars.figure': list(itertools.product(gini_areas, served.anios_gini)),
+        'Graph.figure': list(itertools.product(served.paises, desagregacion)),
+        'Graph_line.figure': list(itertools.product(served.paises, ['Área geográfica', 'Quintil'])),
+        'mujeres_lh_ts.figure': list(itertools.product(uniques('mujeres_labor_hogar_AG_quintiles', 'País'),
+                                                       desagregacion)),
+        'tpe_graph.figure': list(itertools.product(uniques('tasa_de_participacion_economica', 'País'),
+                                                   ['Área geográfica',
+                                                    'Grupo edad para participación en la PEA',
+                                                    'Quintil'])),
+        'rims_graph.figure': [(y,) for y in served.anios_rim],
+        'rims2_graph.figure': list(itertools.product(uniques('relacion_ingreso_medio_sexo', 'País'),
+                                                     uniques('relacion_ingreso_medio_sexo', 'Área geográfica'))),
+        'oui_graph.figure': [(c,) for c in uniques('ocupados_informal_sexo', 'País')],
+        'edu_graph.figure': list(itertools.product(uniques('poblacion_adulta_escolaridad', 'País'),
+                                                   served.anios_gini, selections)),
+        'hog_graph.figure': list(itertools.product(uniques('hogares_disponibilidad_servicios', 'País'),
+                                                   year_range('hogares_disponibilidad_servicios'))),
+        'elec_graph.figure': list(itertools.product(uniques('acceso_electricidad_quintil', 'País'),
+                                                    year_range('acceso_electricidad_quintil'))),
+        'section.children': [(name,) for name, label, section in sections],
+    }
+
+def warm_cache(callback_ids=None):
+    # Sections last, outside the limit: every visitor loads one, and the
+    # figures they embed are cached besides the responses warm() counts
+    domains = {callback_id: domain for callback_id, domain in warm_domains().items()
+               if callback_ids is None or callback_id in callback_ids}
+    tabs = {'section.children': domains.pop('section.children')} if 'section.children' in domains else {}
+    figure_cache.warm(app, domains, limit=figure_responses.maxsize - len(sections))
+    figure_cache.warm(app, tabs)
+
+# Indicators each figure is drawn from (views included through their source),
+# so a refresh only invalidates the figures of the indicators that changed
+figure_sources = {'gini_graph.figure': ['gini'],
+                  'gini_bars.figure': ['gini'],
+                  'Graph.figure': ['tamano_hogar'],
+                  'Graph_line.figure': ['tamano_hogar'],
+                  'mujeres_lh_ts.figure': ['mujeres_labor_hogar_AG_quintiles'],
+                  'tpe_graph.figure': ['tasa_de_participacion_economica', 'tasa_de_participacion_economica_quintil'],
+                  'rims_graph.figure': ['relacion_ingreso_medio_sexo'],
+                  'rims2_graph.figure': ['relacion_ingreso_medio_sexo'],
+                  'oui_graph.figure': ['ocupados_informal_sexo'],
+                  'edu_graph.figure': ['asistencia_escolar_quintil'],
+                  'hog_graph.figure': ['hogares_disponibilidad_servicios'],
+                  'elec_graph.figure': ['acceso_electricidad_quintil'],
+                  'vic_graph.figure': ['tasa_victimizacion'],
+                  '51_graph.figure': ['relacion_quintil_5_1']}
+
+def figure_versions(ds):
+    return {callback_id: ds.version_of(names) for callback_id, names in figure_sources.items()}
+
+figure_responses = figure_cache.FigureCache(served.version,
+                                            shared=figure_cache.open_shared(
+                                                os.environ.get('CEPAL_FIGURE_CACHE_DB',
+                                                               os.path.join(store.STORE_DIR, 'figures.sqlite'))),
+                                            versions=figure_versions(served.data))
+def decimals(callback_id):
+    # Rounding places for a figure's valor: the finest of its indicators
+    places = [served.data.decimals(name) for name in figure_sources.get(callback_id, [])]
+    return max(places) if places and None not in places else None
+
+responses.install(app, decimals)
+profiling.install(app)
+figure_cache.install(app, figure_responses)
+# A tab's content is the same for every visitor until the data changes
+figure_cache.install(app, figure_responses, ['section.children'])
+figure_cache.serve(server)
+if WARM_CACHE:
+    warm_cache()
+metrics.install(app, figure_responses)
+
+def swap_dataset(ds):
+    """Serve a refreshed dataset. Called by the refresh thread, once `ds` is loaded."""
+    changed = {callback_id for callback_id, version in figure_versions(ds).items()
+               if figure_responses.versions.get(callback_id) != version}
+    if ds.version != figure_responses.version:
+        # Sections are cached under the dataset version
+        changed.add('section.children')
+    # No callback runs meanwhile: none reads the new data under the old versions
+    with figure_responses.swap.swapping():
+        use_dataset(ds)
+        figure_responses.use(ds.version, figure_versions(ds))
+    if WARM_CACHE:
+        warm_cache(changed)
+
+refresher = refresh.watch(server, swap_dataset)
+
+def preload():
+    """Load the data and plotly.express now instead of on first use (gunicorn --preload)."""
+    served.data.preload()
+    px.line  # first attribute access runs the deferred import
+    build_layout(served.version)
 
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
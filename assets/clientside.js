@@ -0,0 +1,148 @@
+/* Figures drawn in the browser from the payloads of clientside.py.
+ *
+ * lines(selected, filter values..., payload) returns the figure
+ * px.line(rows, x='Años', y='valor', color=..., facet_col=...) gives for
+ * the rows of the selected colors (countries) matching the filter values,
+ * or {} when there are none, like the server callbacks.
+ *
+ * selection(clicks..., state) is the state machine of edu_graph's selector
+ * buttons (app_graphs.edu_buttons).
+ */
+// Dimension of the buttons of each selector row, in order
+var SELECTOR_DIMENSIONS = ['Sexo', 'Quintil', 'Área geográfica'];
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    cepal: {
+        /* state is {x: dimension or null, group: dimension or null}. Clicking
+         * the selected button of a row clears it; clicking another one selects
+         * it if the row has none selected, and for the grouping, if it is not
+         * the x dimension. Anything else changes nothing, and sends nothing.
+         * Returns the new state and the className of every button.
+         */
+        selection: function () {
+            var dc = window.dash_clientside;
+            var args = Array.prototype.slice.call(arguments);
+            var state = args.pop() || {};
+            var triggered = dc.callback_context.triggered.map(function (t) { return t.prop_id.split('.')[0]; });
+            var ids = dc.callback_context.inputs_list.map(function (input) { return input.id; });
+            var i = ids.indexOf(triggered[0]);
+            if (i < 0) {
+                throw dc.PreventUpdate;
+            }
+            var row = i < SELECTOR_DIMENSIONS.length ? 'x' : 'group';
+            var dim = SELECTOR_DIMENSIONS[i % SELECTOR_DIMENSIONS.length];
+            var next = {x: state.x || null, group: state.group || null};
+            if (next[row] === dim) {
+                next[row] = null;
+            } else if (next[row] === null && !(row === 'group' && next.x === dim)) {
+                next[row] = dim;
+            } else {
+                throw dc.PreventUpdate;
+            }
+            var classes = ids.map(function (id, j) {
+                var selected = next[j < SELECTOR_DIMENSIONS.length ? 'x' : 'group'] ===
+                    SELECTOR_DIMENSIONS[j % SELECTOR_DIMENSIONS.length];
+                return selected ? 'selector selected' : 'selector';
+            });
+            return [next].concat(classes);
+        },
+
+        lines: function () {
+            var args = Array.prototype.slice.call(arguments);
+            var payload = args.pop();
+            var selected = args.shift();
+            if (!payload || !Array.isArray(selected)) {
+                return {};
+            }
+            var columns = payload.columns;
+            var color = columns[payload.color];
+            var facet = payload.facet ? columns[payload.facet] : null;
+            var years = columns['Años'];
+            var values = columns['valor'];
+
+            // Filters and selection as category codes; an unknown filter value matches nothing
+            var filters = payload.filters.map(function (name, i) {
+                return {codes: columns[name].codes, code: columns[name].categories.indexOf(args[i])};
+            });
+            var wanted = {};
+            selected.forEach(function (c) {
+                var code = color.categories.indexOf(c);
+                if (code >= 0) {
+                    wanted[code] = true;
+                }
+            });
+
+            // One trace per (color, facet) pair
+            var traces = [], groups = {}, colorOrder = {}, facetOrder = {};
+            var nColors = 0, nFacets = 0, minYear = Infinity, maxYear = -Infinity;
+            for (var i = 0; i < values.length; i++) {
+                var c = color.codes[i];
+                if (!wanted[c] || filters.some(function (f) { return f.codes[i] !== f.code; })) {
+                    continue;
+                }
+                var panel = facet ? facet.codes[i] : 0;
+                if (!(c in colorOrder)) {
+                    colorOrder[c] = nColors++;
+                }
+                if (!(panel in facetOrder)) {
+                    facetOrder[panel] = nFacets++;
+                }
+                var key = c + ':' + panel;
+                var group = groups[key];
+                if (!group) {
+                    group = groups[key] = {color: c, facet: panel, x: [], y: []};
+                    traces.push(group);
+                }
+                group.x.push(years[i]);
+                group.y.push(values[i]);
+                minYear = Math.min(minYear, years[i]);
+                maxYear = Math.max(maxYear, years[i]);
+            }
+            if (!traces.length || traces.some(function (g) { return payload.names[g.color] === null; })) {
+                return {};
+            }
+
+            // px orders them by color, then facet, each in order of first appearance
+            traces.sort(function (a, b) {
+                return colorOrder[a.color] - colorOrder[b.color] || facetOrder[a.facet] - facetOrder[b.facet];
+            });
+
+            var labels = payload.labels;
+            var legend = {};
+            var data = traces.map(function (group) {
+                var name = color.categories[group.color];
+                var hover = [payload.color + '=' + name];
+                var n = facetOrder[group.facet];
+                if (facet) {
+                    hover.push(payload.facet + '=' + facet.categories[group.facet]);
+                }
+                hover.push(labels['Años'] + '=%{x}', labels['valor'] + '=%{y}');
+                var trace = {
+                    hovertemplate: hover.join('<br>') + '<extra></extra>',
+                    legendgroup: name,
+                    line: {color: payload.colors[colorOrder[group.color] % payload.colors.length], dash: 'solid'},
+                    mode: 'lines+markers',
+                    name: payload.names[group.color],
+                    orientation: 'v',
+                    showlegend: !legend[group.color],
+                    x: group.x,
+                    xaxis: n ? 'x' + (n + 1) : 'x',
+                    y: group.y,
+                    yaxis: n ? 'y' + (n + 1) : 'y',
+                    type: 'scatter'
+                };
+                legend[group.color] = true;
+                return trace;
+            });
+
+            var layout = JSON.parse(JSON.stringify(payload.layout));
+            if (payload.ticks) {
+                layout.xaxis.tickvals = [];
+                for (var year = minYear; year <= maxYear; year++) {
+                    layout.xaxis.tickvals.push(year);
+                }
+            }
+            return {data: data, layout: layout};
+        }
+    }
+});
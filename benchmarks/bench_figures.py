@@ -0,0 +1,110 @@
+"""Figure build time per chart, plotly.express against the templates of figures.py.
+
+    python benchmarks/bench_figures.py [--app-dir DIR] [--output FILE]
+                                       [--callback ID ...] [--limit N] [--repeat N]
+
+Every figure callback (and the charts drawn in the browser, through their
+server functions) is called over its input domain from cases.domains(),
+once with figures.ENABLED off (px.line and px.bar) and once on, bypassing
+the figure cache. Both figures are serialized as Dash would and must be
+equal; the p50 build time of each and the speedup are printed and written
+as JSON to FILE (default bench_figures.json).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import warnings
+
+import numpy
+
+from bench_latency import innermost, sample, serialize
+from cases import domains
+
+
+def build(callback_id, func, domain, repeat):
+    seconds, outputs = [], []
+    for _ in range(repeat):
+        for args in domain:
+            start = time.perf_counter()
+            try:
+                value = func(*args)
+            except Exception:
+                continue
+            seconds.append(time.perf_counter() - start)
+            outputs.append(serialize(callback_id, value))
+    return seconds, outputs[:len(outputs) // repeat]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument('--output', default='bench_figures.json')
+    parser.add_argument('--callback', action='append', help='callback id, e.g. edu_graph.figure (repeatable)')
+    parser.add_argument('--limit', type=int, help='inputs per chart, evenly spaced over its domain')
+    parser.add_argument('--repeat', type=int, default=3)
+    opts = parser.parse_args()
+    output = os.path.abspath(opts.output)
+
+    warnings.simplefilter('ignore')
+    os.chdir(opts.app_dir)
+    sys.path.insert(0, opts.app_dir)
+    import app_graphs
+    import figures
+
+    inputs = domains(app_graphs)
+    charts = {callback_id: innermost(spec['callback']) for callback_id, spec in app_graphs.app.callback_map.items()
+              if callback_id.endswith('.figure') and 'callback' in spec}
+    for callback_id, func, data in [('vic_graph.figure', app_graphs.victim, 'tasa_victimizacion'),
+                                    ('51_graph.figure', app_graphs.quintil51, 'relacion_quintil_5_1')]:
+        if callback_id not in charts:
+            charts[callback_id] = func
+            countries = list(app_graphs.index.values(data, 'País'))
+            selections = [[c] for c in countries] + [countries]
+            if callback_id == '51_graph.figure':
+                areas = list(app_graphs.index.values(data, 'Área geográfica'))
+                inputs[callback_id] = [(s, a) for s in selections for a in areas]
+            else:
+                inputs[callback_id] = [(s,) for s in selections]
+
+    results = {}
+    for callback_id, func in charts.items():
+        if opts.callback and callback_id not in opts.callback:
+            continue
+        domain = sample(inputs[callback_id], opts.limit)
+        timings = {}
+        for mode, enabled in (('px', False), ('template', True)):
+            figures.ENABLED = enabled
+            # One pass first: plotly's validators, and the templates, are built once per process
+            build(callback_id, func, domain, 1)
+            timings[mode] = build(callback_id, func, domain, opts.repeat)
+        (px_seconds, px_out), (tpl_seconds, tpl_out) = timings['px'], timings['template']
+        mismatches = sum(json.loads(a) != json.loads(b) for a, b in zip(px_out, tpl_out))
+        mismatches += abs(len(px_out) - len(tpl_out))
+        if not px_seconds:
+            print('{:<22} no successful calls'.format(callback_id))
+            continue
+        px_p50 = numpy.median(px_seconds) * 1000
+        tpl_p50 = numpy.median(tpl_seconds) * 1000
+        results[callback_id] = {'calls': len(px_seconds), 'mismatches': mismatches,
+                                'px_p50_ms': round(px_p50, 3), 'template_p50_ms': round(tpl_p50, 3),
+                                'speedup': round(px_p50 / tpl_p50, 2)}
+        print('{:<22} {:>5} calls  px {:>8.2f} ms  template {:>8.2f} ms  x{:>5.1f}  {} mismatches'.format(
+            callback_id, len(px_seconds), px_p50, tpl_p50, px_p50 / tpl_p50, mismatches))
+    figures.ENABLED = True
+
+    with open(output, 'w') as f:
+        json.dump({'dataset_version': app_graphs.served.version,
+                   'python': platform.python_version(),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'repeat': opts.repeat,
+                   'limit': opts.limit,
+                   'charts': results}, f, indent=1)
+    print('wrote', output)
+    sys.exit(1 if any(r['mismatches'] for r in results.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Latency percentiles and peak memory of every callback over its input domain.
+
+    python benchmarks/bench_latency.py [--app-dir DIR] [--output FILE]
+                                       [--callback ID ...] [--limit N] [--repeat N]
+
+Imports app_graphs from DIR (default: the repo root) and enumerates
+app.callback_map. Each callback is called through its undecorated function,
+bypassing the figure cache, for every input combination in cases.domains()
+(or `limit` of them, evenly spaced). The two halves of a request are timed
+separately: building the figure (pandas and plotly) and serializing the
+response the way the app does (responses.dumps: orjson, or Dash's encoder
+with CEPAL_ORJSON=0), whose size is reported too. Peak memory is measured under tracemalloc in a
+separate pass so that it does not slow down the timings.
+
+Results are printed and written as JSON to FILE (default bench_latency.json).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy
+
+from cases import domains
+
+
+def innermost(func):
+    while hasattr(func, '__wrapped__'):
+        func = func.__wrapped__
+    return func
+
+
+def serialize(callback_id, value):
+    # The JSON document sent for a single-output callback
+    import responses  # from the app directory, on sys.path once main() ran
+    id_, prop = callback_id.rsplit('.', 1)
+    return responses.dumps({'response': {id_: {prop: value}}, 'multi': True})
+
+
+def sample(domain, limit):
+    if limit is None or len(domain) <= limit:
+        return list(domain)
+    return [domain[int(i)] for i in numpy.linspace(0, len(domain) - 1, limit)]
+
+
+def run(callback_id, func, args):
+    start = time.perf_counter()
+    value = func(*args)
+    built = time.perf_counter()
+    text = serialize(callback_id, value)
+    return built - start, time.perf_counter() - built, len(text.encode('utf-8'))
+
+
+def peak(callback_id, func, args):
+    tracemalloc.start()
+    try:
+        serialize(callback_id, func(*args))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def percentiles(seconds):
+    p50, p95, p99 = numpy.percentile(seconds, [50, 95, 99]) * 1000
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+
+
+def measure(callback_id, func, domain, repeat):
+    build, dump, total, sizes = [], [], [], []
+    errors = 0
+    for _ in range(repeat):
+        for args in domain:
+            try:
+                b, s, size = run(callback_id, func, args)
+            except Exception:
+                # PreventUpdate, or a combination the chart cannot draw
+                errors += 1
+                continue
+            build.append(b)
+            dump.append(s)
+            total.append(b + s)
+            sizes.append(size)
+    peaks = []
+    for args in domain:
+        try:
+            peaks.append(peak(callback_id, func, args))
+        except Exception:
+            pass
+    result = {'inputs': len(domain), 'calls': len(total), 'errors': errors}
+    if total:
+        result.update(total=percentiles(total), build=percentiles(build), serialize=percentiles(dump),
+                      bytes={'p50': int(numpy.median(sizes)), 'max': max(sizes)})
+    if peaks:
+        result['peak_kb'] = round(max(peaks) / 1024, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument('--output', default='bench_latency.json')
+    parser.add_argument('--callback', action='append', help='callback id, e.g. gini_graph.figure (repeatable)')
+    parser.add_argument('--limit', type=int, help='inputs per callback, evenly spaced over its domain')
+    parser.add_argument('--repeat', type=int, default=1)
+    opts = parser.parse_args()
+    output = os.path.abspath(opts.output)
+
+    warnings.simplefilter('ignore')
+    os.chdir(opts.app_dir)
+    sys.path.insert(0, opts.app_dir)
+    import app_graphs
+
+    inputs = domains(app_graphs)
+    results = {}
+    for callback_id, spec in app_graphs.app.callback_map.items():
+        if opts.callback and callback_id not in opts.callback or 'callback' not in spec:
+            continue
+        func = innermost(spec['callback'])
+        domain = sample(inputs[callback_id], opts.limit)
+        # One call first so plotly's one-off template and validator setup is not counted
+        for args in domain:
+            try:
+                func(*args)
+                break
+            except Exception:
+                pass
+        results[callback_id] = measure(callback_id, func, domain, opts.repeat)
+
+        r = results[callback_id]
+        if 'total' in r:
+            print('{:<22} {:>5} calls  p50 {:>8.2f}  p95 {:>8.2f}  p99 {:>8.2f} ms'
+                  '  (build {:>8.2f} / json {:>7.2f} p50)  {:>7} B  peak {:>8.1f} KB'.format(
+                      callback_id, r['calls'], r['total']['p50_ms'], r['total']['p95_ms'],
+                      r['total']['p99_ms'], r['build']['p50_ms'], r['serialize']['p50_ms'],
+                      r['bytes']['p50'], r.get('peak_kb', 0)))
+        else:
+            print('{:<22} no successful calls ({} errors)'.format(callback_id, r['errors']))
+
+    with open(output, 'w') as f:
+        json.dump({'dataset_version': app_graphs.served.version,
+                   'python': platform.python_version(),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'repeat': opts.repeat,
+                   'limit': opts.limit,
+                   'callbacks': results}, f, indent=1)
+    print('wrote', output)
+
+
+if __name__ == '__main__':
+    main()
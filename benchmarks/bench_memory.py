@@ -0,0 +1,59 @@
+"""Peak memory allocated per figure callback.
+
+    python benchmarks/bench_memory.py [--app-dir DIR] [--output FILE]
+
+Imports app_graphs from DIR (default: the repo root), then calls each
+callback's undecorated function, bypassing the figure cache, once per case
+in cases.py under tracemalloc. Every callback is called once before
+measuring so that plotly's one-off template and validator setup is not
+counted. Point --app-dir at a checkout of an older revision to compare
+before/after.
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+import warnings
+
+from cases import cases
+
+
+def measure(func, args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument('--output', help='write the results as JSON')
+    opts = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    os.chdir(opts.app_dir)
+    sys.path.insert(0, opts.app_dir)
+    import app_graphs
+
+    results = {}
+    for name, arglist in cases(app_graphs).items():
+        func = getattr(app_graphs, name)
+        func = getattr(func, '__wrapped__', func)
+        func(*arglist[0])
+        peaks = [measure(func, args) for args in arglist]
+        results[name] = {'peak_kb_max': round(max(peaks) / 1024, 1),
+                         'peak_kb_mean': round(sum(peaks) / len(peaks) / 1024, 1)}
+        print('{:<22} max {:>9.1f} KB   mean {:>9.1f} KB'.format(
+            name, results[name]['peak_kb_max'], results[name]['peak_kb_mean']))
+
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
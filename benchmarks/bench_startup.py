@@ -0,0 +1,105 @@
+"""Time a worker's startup by phase, in fresh interpreters.
+
+    python benchmarks/bench_startup.py [--app-dir DIR] [--runs N] [--top N] [--output FILE]
+
+Each run starts a new Python process in DIR (default: the repo root) and
+times, one after the other: the third-party imports, the app's own modules,
+importing app_graphs (dataset, layout, callbacks), the first /_dash-layout
+request and the first figure callback (which pays for the deferred
+plotly.express import and the first indicator load). Prints the median of
+every phase over the runs, then the modules with the highest own import
+time according to `python -X importtime`.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+CHILD = r'''
+import json, sys, time, warnings
+warnings.simplefilter('ignore')
+sys.path.insert(0, '.')
+laps = []
+last = time.perf_counter()
+
+def lap(name):
+    global last
+    now = time.perf_counter()
+    laps.append([name, now - last])
+    last = now
+
+import numpy, pandas
+lap('numpy + pandas')
+import flask, dash, dash_core_components, dash_html_components, dash_bootstrap_components
+lap('flask + dash')
+import plotly.graph_objects
+lap('plotly.graph_objects')
+import schema, store, index, views, dataset, figure_cache, metrics, profiling
+lap('app modules')
+import app_graphs
+lap('import app_graphs')
+app_graphs.server.test_client().get('/_dash-layout')
+lap('first /_dash-layout')
+func = app_graphs.app.callback_map['gini_graph.figure']['callback']
+while hasattr(func, '__wrapped__'):
+    func = func.__wrapped__
+func('Nacional')
+lap('first figure callback')
+print(json.dumps(laps))
+'''
+
+
+def run(app_dir):
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=app_dir, check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def import_times(app_dir, top):
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app_graphs'], cwd=app_dir,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True).stderr
+    rows = []
+    for line in err.splitlines():
+        m = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        if m:
+            rows.append((int(m.group(1)), int(m.group(2)), m.group(4)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='modules to list by own import time')
+    parser.add_argument('--output', help='write the results as JSON')
+    opts = parser.parse_args()
+
+    # The first run also converts the store if needed; it is not counted
+    run(opts.app_dir)
+    runs = [run(opts.app_dir) for _ in range(opts.runs)]
+    phases = [name for name, _ in runs[0]]
+    medians = {name: statistics.median(r[i][1] for r in runs) for i, name in enumerate(phases)}
+    total = statistics.median(sum(seconds for _, seconds in r) for r in runs)
+    for name in phases:
+        print('{:<24} {:>8.1f} ms'.format(name, medians[name] * 1000))
+    print('{:<24} {:>8.1f} ms'.format('total', total * 1000))
+
+    modules = import_times(opts.app_dir, opts.top)
+    print('\nown import time (cumulative) of the slowest modules:')
+    for own, cumulative, name in modules:
+        print('{:>8.1f} ms ({:>8.1f} ms)  {}'.format(own / 1000, cumulative / 1000, name))
+
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            json.dump({'runs': opts.runs,
+                       'phases_ms': {name: round(s * 1000, 1) for name, s in medians.items()},
+                       'total_ms': round(total * 1000, 1),
+                       'modules_us': [{'module': n, 'self': o, 'cumulative': c} for o, c, n in modules]},
+                      f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
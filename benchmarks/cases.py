@@ -0,0 +1,45 @@
+"""Callback inputs shared by the scripts here: representative cases and full domains."""
+
+
+def cases(app):
+    return {
+        'update_ginibars': [('Nacional', 2014), ('Urbana', 2005)],
+        'update_graph': [('Chile', 'Quintil'), ('México', 'Área geográfica')],
+        'update_graph_line': [('Chile', 'Quintil'), ('México', 'Área geográfica')],
+        'update_graph_line_mh': [('Chile', 'Quintil'), ('México', 'Área geográfica')],
+        'ug_bars': [('Chile', 'Área geográfica'), ('Chile', 'Grupo edad para participación en la PEA'),
+                    ('Chile', 'Quintil')],
+        'order_bars': [(2010,), (2018,)],
+        'ss_bars': [('Chile', 'Nacional'), ('Brasil', 'Urbana')],
+        'stack_bars': [('Chile',), ('Argentina',)],
+        'c_gini': [('Nacional',), ('Rural',)],
+        'edu_graph': [('Chile', 2010, {'x': 'Sexo', 'group': 'Quintil'}),
+                      ('Chile', 2010, {'x': 'Área geográfica', 'group': 'Sexo'})],
+        'hog_graph': [('Chile', 2010), ('Perú', 2015)],
+        'elec_graph': [('Chile', 2010), ('Perú', 2015)],
+        'victim': [(['Argentina', 'Chile', 'México'],)],
+        'quintil51': [(['Argentina', 'Chile', 'México'], 'Nacional')],
+    }
+
+
+def domains(app):
+    """Every input combination of every callback, by callback id.
+
+    The single-select figure charts take their dropdown/slider domains from
+    app.warm_domains(); the multi-select charts get each country alone and
+    all of them at once.
+    """
+    result = dict(app.warm_domains())
+    for callback_id, data in [('vic_graph.figure', 'tasa_victimizacion'),
+                              ('51_graph.figure', 'relacion_quintil_5_1')]:
+        if 'callback' not in app.app.callback_map[callback_id]:
+            # Drawn in the browser (CEPAL_CLIENTSIDE)
+            continue
+        countries = list(app.index.values(data, 'País'))
+        selections = [[c] for c in countries] + [countries]
+        if callback_id == '51_graph.figure':
+            areas = list(app.index.values(data, 'Área geográfica'))
+            result[callback_id] = [(s, a) for s in selections for a in areas]
+        else:
+            result[callback_id] = [(s,) for s in selections]
+    return result
@@ -0,0 +1,97 @@
+"""Hammer every figure callback from many threads and check for races.
+
+    python benchmarks/check_concurrency.py [--threads N] [--rounds N]
+
+Each case from cases.py is first rendered serially as a reference. Then all
+cases are run concurrently, shuffled, `rounds` times, once through the bare
+callback functions and once through the dispatch path Dash uses
+(app.callback_map, including the figure cache). Every response must match
+its reference and the shared indicator frames must be unchanged afterwards.
+Exits with status 1 on any difference.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import warnings
+
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+from cases import cases
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def innermost(func):
+    while hasattr(func, '__wrapped__'):
+        func = func.__wrapped__
+    return func
+
+
+def fingerprint(frames):
+    return {name: (list(frames[name].columns), int(pd.util.hash_pandas_object(frames[name]).sum()))
+            for name in frames}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=10)
+    opts = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    import app_graphs
+    import figure_cache
+
+    dispatch = {}
+    for callback_id, spec in app_graphs.app.callback_map.items():
+        if 'callback' not in spec:
+            continue
+        dispatch[innermost(spec['callback']).__name__] = (callback_id, spec['callback'])
+
+    jobs = []
+    for name, arglist in cases(app_graphs).items():
+        if name not in dispatch:
+            # Drawn in the browser (CEPAL_CLIENTSIDE)
+            continue
+        callback_id, cached = dispatch[name]
+        bare = getattr(app_graphs, name).__wrapped__
+        outputs = figure_cache.outputs_list(callback_id)
+        for args in arglist:
+            reference = json.dumps(bare(*args), cls=PlotlyJSONEncoder)
+            jobs.append((name, 'bare', lambda bare=bare, args=args: json.dumps(bare(*args), cls=PlotlyJSONEncoder),
+                         reference))
+            expected = cached.__wrapped__(*args, outputs_list=outputs)
+            jobs.append((name, 'dispatch', lambda cached=cached, args=args, outputs=outputs: cached(*args, outputs_list=outputs),
+                         expected))
+
+    before = fingerprint(app_graphs.served.data)
+    work = jobs * opts.rounds
+    random.shuffle(work)
+    failures = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=opts.threads) as pool:
+        futures = {pool.submit(run): (name, path, expected) for name, path, run, expected in work}
+        for future in concurrent.futures.as_completed(futures):
+            name, path, expected = futures[future]
+            try:
+                ok = future.result() == expected
+            except Exception as e:
+                ok = False
+                print('{} ({}): {}: {}'.format(name, path, type(e).__name__, e))
+            if not ok:
+                failures[(name, path)] = failures.get((name, path), 0) + 1
+
+    mutated = [name for name, value in fingerprint(app_graphs.served.data).items() if before[name] != value]
+    print('{} calls on {} threads: {} mismatches'.format(len(work), opts.threads, sum(failures.values())))
+    for (name, path), count in sorted(failures.items()):
+        print('  {:<22} {:<9} {}'.format(name, path, count))
+    if mutated:
+        print('shared frames modified: {}'.format(', '.join(mutated)))
+    sys.exit(1 if failures or mutated else 0)
+
+
+if __name__ == '__main__':
+    main()
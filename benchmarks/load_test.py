@@ -0,0 +1,226 @@
+"""Replay _dash-update-component requests against the app and report capacity.
+
+    python benchmarks/load_test.py [--concurrency N] [--requests N]
+                                   [--url URL | --gunicorn WORKERS] [--output FILE]
+
+Builds the POST body the browser sends for every input combination in
+cases.domains() and replays them, picked at random, from `concurrency`
+threads. Requests go through the whole server stack: Dash request parsing,
+the figure cache, serialization and Flask-Compress (Accept-Encoding
+advertises br and gzip like a browser does). Targets:
+
+    (default)        in-process, through the Flask test client of app_graphs.server
+    --url URL        an already running server, e.g. http://127.0.0.1:8050
+    --gunicorn N     a local `gunicorn app_graphs:server` with N workers, started
+                     and stopped by this script (--threads per worker)
+
+Reports throughput and latency percentiles per callback id and overall, and
+optionally writes them as JSON.
+"""
+import argparse
+import collections
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import warnings
+
+import numpy
+
+from cases import domains
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEADERS = {'Content-Type': 'application/json', 'Accept-Encoding': 'br, gzip'}
+
+
+def payload(callback_id, spec, args):
+    # The body dash-renderer posts: inputs then state, in declaration order
+    values = list(args)
+    inputs = [dict(i, value=values.pop(0)) for i in spec['inputs']]
+    state = [dict(s, value=values.pop(0)) for s in spec.get('state', [])]
+    id_, prop = callback_id.rsplit('.', 1)
+    return json.dumps({'output': callback_id,
+                       'outputs': {'id': id_, 'property': prop},
+                       'inputs': inputs,
+                       'state': state,
+                       'changedPropIds': ['{id}.{property}'.format(**inputs[0])]}).encode('utf-8')
+
+
+class InProcess:
+    """One Flask test client per thread on the imported server."""
+
+    def __init__(self, server):
+        self.server = server
+        self.local = threading.local()
+
+    def post(self, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.server.test_client()
+        response = client.post('/_dash-update-component', data=body, headers=HEADERS)
+        response.get_data()
+        return response.status_code
+
+
+class Http:
+    """One keep-alive connection per thread to a running server."""
+
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.path = parts.path.rstrip('/') + '/_dash-update-component'
+        self.local = threading.local()
+
+    def post(self, body):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request('POST', self.path, body=body, headers=HEADERS)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.local.conn = None
+            conn.close()
+            raise
+        return response.status
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, threads):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app_graphs:server',
+                                '--bind', '127.0.0.1:{}'.format(port),
+                                '--workers', str(workers), '--threads', str(threads)],
+                               cwd=APP_DIR)
+    url = 'http://127.0.0.1:{}'.format(port)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit('gunicorn exited with status {}'.format(process.returncode))
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return process, url
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    sys.exit('gunicorn did not start within 120 s')
+
+
+def summary(latencies, errors, elapsed):
+    result = {'requests': len(latencies) + errors, 'errors': errors,
+              'throughput_rps': round(len(latencies) / elapsed, 1)}
+    if latencies:
+        p50, p95, p99 = numpy.percentile(latencies, [50, 95, 99]) * 1000
+        result.update(p50_ms=round(p50, 2), p95_ms=round(p95, 2), p99_ms=round(p99, 2),
+                      max_ms=round(max(latencies) * 1000, 2))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000, help='total requests')
+    parser.add_argument('--url', help='base URL of a running server')
+    parser.add_argument('--gunicorn', type=int, metavar='WORKERS', help='start a local gunicorn')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--callback', action='append', help='callback id to include (repeatable)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON')
+    opts = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    os.chdir(APP_DIR)
+    sys.path.insert(0, APP_DIR)
+    import app_graphs
+
+    bodies = {}
+    for callback_id, domain in domains(app_graphs).items():
+        if opts.callback and callback_id not in opts.callback:
+            continue
+        spec = app_graphs.app.callback_map[callback_id]
+        bodies[callback_id] = [payload(callback_id, spec, args) for args in domain]
+    callback_ids = sorted(bodies)
+
+    process = None
+    if opts.gunicorn:
+        process, url = start_gunicorn(opts.gunicorn, opts.threads)
+        target = Http(url)
+    elif opts.url:
+        target = Http(opts.url)
+    else:
+        target = InProcess(app_graphs.server)
+
+    latencies = collections.defaultdict(list)
+    errors = collections.Counter()
+    lock = threading.Lock()
+    remaining = [opts.requests]
+
+    def worker(n):
+        # Every callback equally often, each over its whole domain
+        rng = random.Random(opts.seed * 1000 + n)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            callback_id = rng.choice(callback_ids)
+            body = rng.choice(bodies[callback_id])
+            start = time.perf_counter()
+            try:
+                # 204 is Dash's answer to PreventUpdate
+                ok = target.post(body) in (200, 204)
+            except (OSError, http.client.HTTPException):
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies[callback_id].append(elapsed)
+                else:
+                    errors[callback_id] += 1
+
+    try:
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(opts.concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    results = {callback_id: summary(latencies[callback_id], errors[callback_id], elapsed)
+               for callback_id in callback_ids}
+    overall = summary([x for values in latencies.values() for x in values], sum(errors.values()), elapsed)
+    for name, r in sorted(results.items()) + [('all', overall)]:
+        print('{:<22} {:>6} req {:>4} err {:>8.1f} req/s  p50 {:>8} p95 {:>8} p99 {:>8} max {:>8} ms'.format(
+            name, r['requests'], r['errors'], r['throughput_rps'],
+            r.get('p50_ms', '-'), r.get('p95_ms', '-'), r.get('p99_ms', '-'), r.get('max_ms', '-')))
+
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            json.dump({'target': opts.url or ('gunicorn x{}'.format(opts.gunicorn) if opts.gunicorn else 'in-process'),
+                       'concurrency': opts.concurrency,
+                       'seconds': round(elapsed, 2),
+                       'overall': overall,
+                       'callbacks': results}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
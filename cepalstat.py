@@ -0,0 +1,160 @@
+"""Streaming reader for CEPALSTAT XML exports.
+
+    python cepalstat.py FILE.xml ...     # print each file's metadata and row count
+
+An export holds the indicator metadata (<metadatos>), the data rows
+(<dato>, one dim_<id> attribute per dimension holding the id of a member),
+then the dimensions naming those members, the notes and the sources. The
+rows come before the names, so they are read as integer ids into compact
+arrays, and every element is dropped once read: memory grows with the row
+count only, never with the size of the text in the document.
+
+Descriptive text is HTML, escaped inside the XML; `text` turns it into
+plain strings for titles and labels.
+"""
+import array
+import html
+import re
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy
+import pandas as pd
+
+import schema
+
+# Indicator attributes kept from <metadatos>
+fields = ('indicador', 'unidad', 'nota', 'definicion', 'tema', 'area')
+
+
+def text(value):
+    """Plain text of an HTML fragment: no tags, entities decoded, spaces collapsed."""
+    value = re.sub(r'<br\s*/?>|</p>', '\n', value or '', flags=re.I)
+    value = html.unescape(re.sub(r'<[^>]+>', '', value))
+    return '\n'.join(' '.join(line.split()) for line in value.splitlines() if line.strip())
+
+
+class Strings:
+    """A column of repeated strings, kept as codes into the distinct values."""
+
+    def __init__(self):
+        self.codes = array.array('i')
+        self.lookup = {}
+
+    def append(self, value):
+        self.codes.append(self.lookup.setdefault(value, len(self.lookup)))
+
+    def column(self, name):
+        # Empty strings are missing values, as in the CSVs
+        return column(name, numpy.frombuffer(self.codes, dtype='i'), [v or None for v in self.lookup])
+
+
+def column(name, codes, names):
+    """The typed column whose row i is names[codes[i]], built without a
+    Python object per row. Same types as schema.apply gives the CSV column."""
+    if name in schema.numeric:
+        return pd.to_numeric(pd.Series(names, dtype=object)).to_numpy()[codes]
+    if name not in schema.text:
+        try:
+            # Numeric codes such as id_fuente, as pandas would read them
+            return pd.to_numeric(pd.Series(names, dtype=object), errors='raise').to_numpy()[codes]
+        except (ValueError, TypeError):
+            pass
+    categories = schema.categories(name, pd.Series(names, dtype=object))
+    position = {category: i for i, category in enumerate(categories)}
+    lookup = numpy.array([position.get(n, -1) for n in names] + [-1])
+    return pd.Categorical.from_codes(lookup[codes], categories, ordered=name in schema.orders)
+
+
+def parse(path):
+    """Yield ('metadata', dict), ('row', attributes), ('dim', (id, name, {member id: name})),
+    ('nota', (id, text)) and ('fuente', dict) in document order."""
+    members = {}
+    # Open elements; each is dropped from its parent once handled
+    stack = []
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            stack.append(element)
+            if tag == 'dim':
+                members = {}
+            continue
+        stack.pop()
+        if tag == 'metadatos':
+            yield 'metadata', {key: text(element.get(key)) for key in fields if element.get(key) is not None}
+        elif tag == 'dato':
+            yield 'row', element.attrib
+        elif tag == 'des':
+            members[element.get('id')] = element.get('name')
+        elif tag == 'dim':
+            yield 'dim', (element.get('id'), element.get('name'), members)
+        elif tag == 'nota' and element.get('id') is not None:
+            yield 'nota', (element.get('id'), text(element.get('descripcion')))
+        elif tag == 'fuente':
+            yield 'fuente', {key: ' '.join(value.split()) for key, value in element.attrib.items()}
+        if stack:
+            del stack[-1][:]
+
+
+def read(path):
+    """The typed frame of an export, and its metadata.
+
+    Columns are the dimensions in declaration order, then id_fuente,
+    ids_notas, iso3 and valor, as in the indicator CSVs.
+    """
+    metadata = {'notas': {}, 'fuentes': []}
+    dims = []
+    ids = {}
+    attributes = {'id_fuente': Strings(), 'ids_notas': Strings(), 'iso3': Strings()}
+    valor = array.array('d')
+    for kind, item in parse(path):
+        if kind == 'row':
+            for key in item:
+                if key.startswith('dim_') and key not in ids:
+                    ids[key] = array.array('i', [-1] * len(valor))
+            for key, member_ids in ids.items():
+                member_ids.append(int(item.get(key, -1)))
+            for key, strings in attributes.items():
+                strings.append(item.get(key, ''))
+            valor.append(float(item['valor']) if item.get('valor') else numpy.nan)
+        elif kind == 'dim':
+            dims.append(item)
+        elif kind == 'nota':
+            metadata['notas'][item[0]] = item[1]
+        elif kind == 'fuente':
+            metadata['fuentes'].append(item)
+        else:
+            metadata.update(item)
+
+    data = {}
+    for dim_id, name, members in dims:
+        member_ids = numpy.frombuffer(ids.get('dim_' + dim_id, array.array('i', [-1] * len(valor))), dtype='i')
+        distinct, codes = numpy.unique(member_ids, return_inverse=True)
+        data[name] = column(name, codes, [members.get(str(i)) for i in distinct])
+    for name, strings in attributes.items():
+        data[name] = strings.column(name)
+    data['valor'] = numpy.frombuffer(valor, dtype='d')
+    return schema.apply(pd.DataFrame(data)), metadata
+
+
+def read_metadata(path):
+    """Only the metadata of an export; rows are skipped as they stream by."""
+    metadata = {'notas': {}, 'fuentes': []}
+    for kind, item in parse(path):
+        if kind == 'metadata':
+            metadata.update(item)
+        elif kind == 'nota':
+            metadata['notas'][item[0]] = item[1]
+        elif kind == 'fuente':
+            metadata['fuentes'].append(item)
+    return metadata
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        frame, metadata = read(path)
+        print('{}: {} rows, columns {}'.format(path, len(frame), list(frame.columns)))
+        for key in fields:
+            if key in metadata:
+                print('  {}: {}'.format(key, metadata[key][:200]))
+        print('  {} notas, {} fuentes'.format(len(metadata['notas']), len(metadata['fuentes'])))
@@ -0,0 +1,63 @@
+"""Row payloads for the charts drawn in the browser (assets/clientside.js).
+
+Multi-select line charts only refilter a small table, so with CEPAL_CLIENTSIDE
+on (the default) their rows are sent once, in a dcc.Store of the layout, and
+the figure is assembled by a clientside callback: no request reaches the
+server when the selection changes. A payload holds
+
+    columns   the rows: category columns as integer codes into their
+              category list, numeric columns as plain lists
+    color, facet, filters, labels, names
+              what px.line was called with, and the trace names (ISO codes)
+    layout, colors
+              the layout of a figure the server built, template included,
+              and the trace color sequence
+
+so the browser draws the same figure plotly.express would.
+"""
+import json
+import os
+
+from plotly.colors import qualitative
+from plotly.utils import PlotlyJSONEncoder
+
+import schema
+
+ENABLED = os.environ.get('CEPAL_CLIENTSIDE', '1') != '0'
+
+
+def encode(frame, columns):
+    encoded = {}
+    for col in columns:
+        values = frame[col]
+        if schema.is_categorical(values):
+            encoded[col] = {'categories': list(values.cat.categories),
+                            'codes': values.cat.codes.tolist()}
+        else:
+            encoded[col] = values.tolist()
+    return encoded
+
+
+def lines(frame, figure, color, labels, names, facet=None, filters=(), ticks=False):
+    """Payload of a px.line chart of the `frame` rows, x 'Años' and y 'valor'.
+
+    `figure` (a go.Figure or a figures.Figure) was built by the server for
+    some selection; its layout is kept as is, except for the x tick values
+    when `ticks` (one per year shown).
+    `filters` are the columns the callback's other inputs select from, and
+    `names` maps `color` values to trace names; a selection with a value
+    missing from it draws nothing, as on the server.
+    """
+    columns = [color] + ([facet] if facet else []) + list(filters)
+    encoded = encode(frame, columns + ['Años', 'valor'])
+    layout = json.loads(json.dumps(figure, cls=PlotlyJSONEncoder))['layout']
+    colorway = layout['template']['layout'].get('colorway') or qualitative.D3
+    return {'columns': encoded,
+            'color': color,
+            'facet': facet,
+            'filters': list(filters),
+            'labels': dict({'Años': 'Años', 'valor': 'valor'}, **labels),
+            'names': [names.get(c) for c in encoded[color]['categories']],
+            'layout': layout,
+            'colors': list(colorway),
+            'ticks': ticks}
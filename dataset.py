@@ -0,0 +1,282 @@
+"""The indicator frames the app serves, as one immutable object.
+
+A Dataset stands for one version of the indicators: typed frames with
+read-only arrays, the derived display columns, the aggregate views
+(views.py) and their row indexes. Each indicator or view is loaded from the
+store, derived, frozen and indexed on first access, so a worker only holds
+what it serves:
+
+    data_frames['gini']                       # loads gini if needed
+    index.slice('gini', area='Nacional')      # same, through its index
+
+Loaded entries are immutable and shared by every thread of a worker. With
+CEPAL_DATASET_BUDGET_MB set, the least recently used ones are dropped once
+their footprint exceeds the budget, and loaded again when next needed.
+
+When CSVs change, refresh.py builds the next Dataset with `successor` and
+makes it current with `activate`; requests keep using the old one until then.
+"""
+import collections
+import collections.abc
+import hashlib
+import os
+import threading
+import types
+
+import numpy
+import pandas as pd
+
+import index
+import schema
+import store
+import views
+
+_current = None
+
+BUDGET = int(os.environ.get('CEPAL_DATASET_BUDGET_MB', 0)) * 1024 * 1024
+
+# Regional aggregates have no ISO code in the source data
+aggregate_codes = {'América Latina (promedio ponderado)': 'AL (pd)',
+                   'América Latina (promedio simple)': 'AL (ps)'}
+
+# Per-indicator display labels: new column -> (source column, format)
+labels = {'relacion_ingreso_medio_sexo': {'Años observados': ('Años', '{}-M/H')}}
+
+
+def iso_codes(frames):
+    # País -> ISO code from the (País, iso3) pairs of every indicator; the
+    # first code seen for a country wins
+    codes = {}
+    for frame in frames.values():
+        if 'País' in frame and 'iso3' in frame:
+            pairs = frame[['País', 'iso3']].drop_duplicates().dropna()
+            for pais, iso in zip(pairs['País'], pairs['iso3']):
+                codes.setdefault(pais, iso)
+    codes.update(aggregate_codes)
+    return codes
+
+
+def relabel(values, label):
+    # Map the distinct values only; rows keep pointing at them by code
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = pd.Series(pd.Categorical(values), index=values.index)
+    categories = [label(c) for c in values.cat.categories]
+    return pd.Categorical.from_codes(values.cat.codes, categories)
+
+
+def derive(name, frame, pais_iso):
+    """Columns computed once per dataset instead of once per request."""
+    extra = {}
+    if 'País' in frame:
+        extra['País (ISO)'] = relabel(frame['País'], lambda pais: pais_iso.get(pais, pais))
+    for col, (source, fmt) in labels.get(name, {}).items():
+        extra[col] = relabel(frame[source], fmt.format)
+    return frame.assign(**extra)
+
+
+def freeze(frame):
+    # Mark every block's array read-only: an in-place write into a shared
+    # frame (df.loc[...] = x, df['valor'] *= 2, ...) raises instead of racing.
+    manager = getattr(frame, '_mgr', None)
+    if manager is None:
+        manager = frame._data
+    for block in manager.blocks:
+        values = block.values
+        if isinstance(values, pd.Categorical):
+            # .codes is a read-only view; its base is the array pandas writes to
+            values = values.codes.base
+        values.flags.writeable = False
+    return frame
+
+
+def footprint(frame, frame_index):
+    indexed = sum(codes.nbytes for codes in frame_index.codes.values())
+    indexed += sum(rows.nbytes for ranges in frame_index.ranges.values() for rows in ranges)
+    return int(frame.memory_usage(index=True, deep=True).sum()) + indexed
+
+
+Entry = collections.namedtuple('Entry', 'frame index nbytes')
+
+
+class Indexes(collections.abc.Mapping):
+    """The row index of every indicator and view, loading them on access."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, name):
+        return self.dataset.entry(name).index
+
+    def __iter__(self):
+        return iter(self.dataset.names + self.dataset.view_names)
+
+    def __len__(self):
+        return len(self.dataset.names) + len(self.dataset.view_names)
+
+
+class Dataset:
+
+    def __init__(self, names, checksums, budget=BUDGET):
+        self.names = tuple(names)
+        self.checksums = types.MappingProxyType(dict(checksums))
+        self.version = store.version(self.names, self.checksums)
+        self.view_names = tuple(name for name, spec in views.specs.items() if spec[0] in self.names)
+        self.budget = budget
+        # Only the País and iso3 columns are needed for the codes
+        self.pais_iso = types.MappingProxyType(iso_codes({
+            name: store.load(name, columns=['País', 'iso3'], digest=self.checksums[name]) for name in self.names}))
+        self.indexes = Indexes(self)
+        self.entries = collections.OrderedDict()
+        self.metadata = {}
+        self.descriptions = {}
+        self.places = {}
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def successor(self, checksums):
+        """The Dataset for new `checksums` of some indicators. It starts with
+        the loaded entries of the others (and of views built from them), as
+        long as the ISO codes the derived columns use are unchanged."""
+        new = Dataset(self.names, dict(self.checksums, **checksums), self.budget)
+        changed = {name for name in self.names if new.checksums[name] != self.checksums[name]}
+        if new.pais_iso == self.pais_iso:
+            with self.lock:
+                for name, entry in self.entries.items():
+                    source = views.specs[name][0] if name in self.view_names else name
+                    if source not in changed:
+                        new.entries[name] = entry
+                new.metadata.update((name, uniques) for name, uniques in self.metadata.items()
+                                    if name not in changed)
+                new.descriptions.update((name, d) for name, d in self.descriptions.items() if name not in changed)
+                new.places.update((name, p) for name, p in self.places.items() if name not in changed)
+        return new
+
+    def version_of(self, names):
+        """Version of the indicators `names` alone, for what is built from them.
+
+        The ISO codes count as well: every indicator contributes to them.
+        """
+        digest = hashlib.sha1('schema {} {}'.format(schema.VERSION, sorted(self.pais_iso.items())).encode())
+        for name in names:
+            digest.update(self.checksums[name].encode())
+        return digest.hexdigest()[:16]
+
+    def build(self, name):
+        if name in self.names:
+            frame = derive(name, store.load(name, digest=self.checksums[name]), self.pais_iso)
+        elif name in self.view_names:
+            frame = views.materialize(name, self, self.version)
+        else:
+            raise KeyError(name)
+        frame = freeze(frame)
+        frame_index = index.FrameIndex(frame)
+        return Entry(frame, frame_index, footprint(frame, frame_index))
+
+    def entry(self, name):
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None:
+                self.entries.move_to_end(name)
+                return entry
+            loading = self.loading.setdefault(name, threading.Lock())
+        # One thread loads, others asking for the same name wait for it
+        with loading:
+            with self.lock:
+                entry = self.entries.get(name)
+            if entry is None:
+                entry = self.build(name)
+                with self.lock:
+                    self.entries[name] = entry
+                    self.evict(keep=name)
+        return entry
+
+    def evict(self, keep):
+        # Drop the least recently used entries beyond the budget. Callers
+        # still holding one of their frames keep it alive until done.
+        if not self.budget:
+            return
+        total = sum(entry.nbytes for entry in self.entries.values())
+        for name in list(self.entries):
+            if total <= self.budget:
+                break
+            if name != keep:
+                total -= self.entries.pop(name).nbytes
+
+    def memory(self):
+        """Footprint in bytes of each loaded indicator and view."""
+        with self.lock:
+            return {name: entry.nbytes for name, entry in self.entries.items()}
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        return self.entry(name).frame
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def slice(self, indicator, **filters):
+        return self.entry(indicator).index.take(**filters)
+
+    def values(self, indicator, column, **filters):
+        """Distinct values of `column`, as index.values. Without filters they
+        come from the store metadata, so the indicator is not loaded for it."""
+        if not filters and indicator in self.names and indicator not in self.entries:
+            uniques = self.uniques(indicator)
+            col = index.aliases.get(column, column)
+            if uniques is not None and col in uniques:
+                return numpy.array(uniques[col])
+        return self.entry(indicator).index.values(column, **filters)
+
+    def uniques(self, name):
+        with self.lock:
+            if name in self.metadata:
+                return self.metadata[name]
+        uniques = store.uniques(name, self.checksums[name])
+        with self.lock:
+            self.metadata[name] = uniques
+        return uniques
+
+    def describe(self, name):
+        """CEPALSTAT metadata of an indicator, as store.describe."""
+        with self.lock:
+            if name in self.descriptions:
+                return self.descriptions[name]
+        description = types.MappingProxyType(store.describe(name, self.checksums[name]))
+        with self.lock:
+            self.descriptions[name] = description
+        return description
+
+    def decimals(self, name):
+        """Decimal places of the indicator's valor in its source, as schema.decimals."""
+        with self.lock:
+            if name in self.places:
+                return self.places[name]
+        places = schema.decimals(self[name]['valor'])
+        with self.lock:
+            self.places[name] = places
+        return places
+
+    def preload(self):
+        """Load every indicator and view now, e.g. before forking workers."""
+        for name in self.names + self.view_names:
+            self.entry(name)
+
+
+def load(names):
+    """The Dataset for `names` in the store, made current. Frames load on first use."""
+    return activate(Dataset(names, store.checksums(names)))
+
+
+def activate(dataset):
+    global _current
+    _current = dataset
+    index.use(dataset.indexes)
+    return dataset
+
+
+def current():
+    return _current
@@ -0,0 +1,396 @@
+"""In-process LRU cache of serialized callback responses.
+
+Dash looks callbacks up in app.callback_map and sends back the JSON string
+they return. `install` wraps those entries, so a repeated combination of
+inputs is answered with the stored JSON without touching pandas, plotly or
+the JSON encoder. Keys carry the version of the data each callback reads
+(or the dataset version), so a refreshed indicator only invalidates the
+figures built from it.
+
+Behind the per-process LRU sits an optional SharedStore: a SQLite file that
+every gunicorn worker on the node reads and writes, so a response rendered
+by one worker is a cache hit for all the others, including cold ones.
+
+Responses are stored compressed as well: gzip when they are rendered, and
+Brotli at a high quality (tens of ms) soon after, in a background thread.
+`serve` sends the encoding the browser accepts as is, so Flask-Compress
+does not compress a cached figure again on every request.
+
+    CEPAL_PRECOMPRESS=0        store and serve plain responses only
+    CEPAL_BROTLI_QUALITY       Brotli quality, 0-11 (default 11)
+"""
+import collections
+import concurrent.futures
+import contextlib
+import gzip
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import flask
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAXSIZE = int(os.environ.get('CEPAL_FIGURE_CACHE_SIZE', 512))
+SHARED_MAX_BYTES = int(os.environ.get('CEPAL_FIGURE_CACHE_DB_MB', 256)) * 1024 * 1024
+# Seconds a shared row's last use may lag behind before a hit records it
+USED_RESOLUTION = 60
+PRECOMPRESS = os.environ.get('CEPAL_PRECOMPRESS', '1') != '0'
+BROTLI_QUALITY = int(os.environ.get('CEPAL_BROTLI_QUALITY', 11))
+
+# Preferred first, when the browser accepts several
+encodings = ('br', 'gzip')
+
+
+def freeze(value):
+    # Callback arguments as a hashable key: lists keep their order (it is the
+    # trace order of multi-select charts), dicts (button styles) do not.
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def outputs_list(callback_id):
+    if callback_id.startswith('..'):
+        return [outputs_list(o) for o in callback_id[2:-2].split('...')]
+    id_, prop = callback_id.rsplit('.', 1)
+    return {'id': id_, 'property': prop}
+
+
+class SharedStore:
+    """Responses, and their encodings, in a SQLite file shared by every
+    process on the node.
+
+    Rows of data versions no longer served are dropped by `keep`, and the
+    least recently used rows go once the responses exceed `max_bytes`.
+    """
+
+    def __init__(self, path, max_bytes=SHARED_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        db = self.connection()
+        with db:
+            db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                       'key TEXT PRIMARY KEY, version TEXT, response TEXT, size INTEGER, used REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+            # Stores created before responses were kept compressed
+            columns = {row[1] for row in db.execute('PRAGMA table_info(responses)')}
+            for encoding in encodings:
+                if encoding not in columns:
+                    db.execute('ALTER TABLE responses ADD COLUMN {} BLOB'.format(encoding))
+
+    def connection(self):
+        # One connection per thread, and never one inherited across a fork
+        db = getattr(self.local, 'db', None)
+        if db is None or self.local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db, self.local.pid = db, os.getpid()
+        return db
+
+    @staticmethod
+    def row_key(key):
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """(response, {encoding: bytes}) stored under `key`, or None."""
+        try:
+            db = self.connection()
+            row = db.execute('SELECT used, response, {} FROM responses WHERE key = ?'.format(', '.join(encodings)),
+                             (self.row_key(key),)).fetchone()
+            now = time.time()
+            if row is not None and now - row[0] > USED_RESOLUTION:
+                # Hits stay reads; eviction order only needs `used` roughly
+                with db:
+                    db.execute('UPDATE responses SET used = ? WHERE key = ?', (now, self.row_key(key)))
+        except sqlite3.Error as e:
+            # A locked or broken store is a cache miss, not a failed request
+            print('figure_cache: shared get failed ({})'.format(e), file=sys.stderr)
+            return None
+        if row is None:
+            return None
+        return row[1], {encoding: data for encoding, data in zip(encodings, row[2:]) if data is not None}
+
+    def put(self, key, response, variants):
+        size = len(response) + sum(len(data) for data in variants.values())
+        try:
+            db = self.connection()
+            with db:
+                db.execute('INSERT OR REPLACE INTO responses (key, version, response, size, used, {}) '
+                           'VALUES (?, ?, ?, ?, ?, {})'.format(', '.join(encodings), ', '.join('?' * len(encodings))),
+                           (self.row_key(key), key[0], response, size, time.time())
+                           + tuple(variants.get(encoding) for encoding in encodings))
+                self.evict(db)
+        except sqlite3.Error as e:
+            print('figure_cache: shared put failed ({})'.format(e), file=sys.stderr)
+
+    def add_encoding(self, key, encoding, data):
+        try:
+            db = self.connection()
+            with db:
+                db.execute('UPDATE responses SET {0} = ?, size = size + ? WHERE key = ? AND {0} IS NULL'.format(encoding),
+                           (data, len(data), self.row_key(key)))
+                self.evict(db)
+        except sqlite3.Error as e:
+            print('figure_cache: shared put failed ({})'.format(e), file=sys.stderr)
+
+    def evict(self, db):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the least recently used rows until back under 90% of the cap
+        target = self.max_bytes * 0.9
+        for key, size in db.execute('SELECT key, size FROM responses ORDER BY used').fetchall():
+            if total <= target:
+                break
+            db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+
+    def keep(self, versions):
+        try:
+            db = self.connection()
+            with db:
+                db.execute('DELETE FROM responses WHERE version NOT IN ({})'.format(','.join('?' * len(versions))),
+                           sorted(versions))
+        except sqlite3.Error as e:
+            print('figure_cache: shared cleanup failed ({})'.format(e), file=sys.stderr)
+
+    def clear(self):
+        db = self.connection()
+        with db:
+            db.execute('DELETE FROM responses')
+
+
+def open_shared(path):
+    try:
+        return SharedStore(path)
+    except sqlite3.Error as e:
+        # Read-only or missing directory: keep the per-process cache only
+        print('figure_cache: shared store {} unavailable ({})'.format(path, e), file=sys.stderr)
+        return None
+
+
+def compress(response):
+    # The encodings cheap enough to make while the request waits
+    return {'gzip': gzip.compress(response.encode('utf-8'), 9, mtime=0)} if PRECOMPRESS else {}
+
+
+class Swap:
+    """Callbacks run under `serving` concurrently; `swapping` waits for them
+    to finish and holds new ones off, so the data and the cache versions a
+    callback sees change together. `serving` is reentrant per thread (a
+    section renders its figures inside its own callback)."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writers = 0
+        self.local = threading.local()
+
+    @contextlib.contextmanager
+    def serving(self):
+        depth = getattr(self.local, 'depth', 0)
+        if not depth:
+            with self.condition:
+                while self.writers:
+                    self.condition.wait()
+                self.readers += 1
+        self.local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.local.depth = depth
+            if not depth:
+                with self.condition:
+                    self.readers -= 1
+                    self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def swapping(self):
+        with self.condition:
+            # Counted while waiting too, so callbacks arriving meanwhile wait
+            self.writers += 1
+            while self.readers:
+                self.condition.wait()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writers -= 1
+                self.condition.notify_all()
+
+
+class FigureCache:
+    """`versions` maps callback ids to the version of the data they read;
+    other callbacks use the dataset `version`. Switch them with `use` under
+    `swap.swapping()`, together with the data.
+
+    Entries are (response, {encoding: bytes}).
+    """
+
+    def __init__(self, version, maxsize=MAXSIZE, shared=None, versions=None):
+        self.maxsize = maxsize
+        self.shared = shared
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.compressor = None
+        self.compressor_pid = None
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.swap = Swap()
+        self.use(version, versions)
+
+    def use(self, version, versions=None):
+        """Serve new data versions, dropping the responses of the old ones."""
+        self.version, self.versions = version, dict(versions or {})
+        current = set(self.versions.values()) | {version}
+        with self.lock:
+            for key in [key for key in self.entries if key[0] not in current]:
+                del self.entries[key]
+        if self.shared is not None:
+            self.shared.keep(current)
+
+    def key(self, callback_id, args, outputs=None):
+        # The response embeds the output ids, so they are part of the key
+        return (self.versions.get(callback_id, self.version), callback_id, freeze(args), freeze(outputs))
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry
+        if self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.put_local(key, entry)
+                with self.lock:
+                    self.shared_hits += 1
+                return entry
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put_local(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def put(self, key, response):
+        entry = response, compress(response)
+        self.put_local(key, entry)
+        if self.shared is not None:
+            self.shared.put(key, *entry)
+        if PRECOMPRESS and brotli is not None:
+            self.background(self.add_brotli, key, response)
+        return entry
+
+    def background(self, func, *args):
+        # One thread per process; a forked worker starts its own
+        with self.lock:
+            if self.compressor is None or self.compressor_pid != os.getpid():
+                self.compressor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='figure_cache')
+                self.compressor_pid = os.getpid()
+            compressor = self.compressor
+        compressor.submit(func, *args)
+
+    def add_brotli(self, key, response):
+        data = brotli.compress(response.encode('utf-8'), quality=BROTLI_QUALITY)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == response:
+                # In place: the entry keeps its LRU position
+                self.entries[key] = response, dict(entry[1], br=data)
+        if self.shared is not None:
+            self.shared.add_encoding(key, 'br', data)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def wrap(self, callback_id, func):
+        def cached(*args, **kwargs):
+            with self.swap.serving():
+                key = self.key(callback_id, args, kwargs.get('outputs_list'))
+                entry = self.get(key)
+                if entry is None:
+                    # PreventUpdate and errors propagate and are not cached
+                    entry = self.put(key, func(*args, **kwargs))
+            if flask.has_request_context():
+                # For serve(), once Dash has set the response text
+                flask.g.figure_encodings = entry[1]
+            return entry[0]
+        cached.__wrapped__ = func
+        return cached
+
+
+def install(app, cache, callback_ids=None):
+    """Route the app's figure callbacks (or `callback_ids`) through `cache`."""
+    for callback_id, spec in app.callback_map.items():
+        if 'callback' not in spec:
+            # Clientside: the browser runs it
+            continue
+        if callback_ids is None:
+            if not callback_id.endswith('.figure'):
+                continue
+        elif callback_id not in callback_ids:
+            continue
+        spec['callback'] = cache.wrap(callback_id, spec['callback'])
+
+
+def serve(server):
+    """Send cached responses in their stored encoding (Brotli, else gzip)
+    when the request accepts it. Register after Dash's Flask-Compress, which
+    then leaves these responses alone."""
+    @server.after_request
+    def precompressed(response):
+        variants = flask.g.pop('figure_encodings', None)
+        if not variants or response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if not flask.request.path.endswith('_dash-update-component'):
+            # A figure embedded in the layout: the body is not the cached response
+            return response
+        for encoding in encodings:
+            if encoding in variants and flask.request.accept_encodings[encoding]:
+                response.set_data(variants[encoding])
+                response.headers['Content-Encoding'] = encoding
+                break
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def warm(app, domains, limit=None):
+    """Pre-render the argument tuples in `domains` ({callback id: [args, ...]}).
+
+    Stops after `limit` responses, so warming never evicts its own entries.
+    """
+    count = 0
+    for callback_id, domain in domains.items():
+        func = app.callback_map[callback_id]['callback']
+        outputs = outputs_list(callback_id)
+        for args in domain:
+            if limit is not None and count >= limit:
+                return count
+            try:
+                func(*args, outputs_list=outputs)
+                count += 1
+            except Exception:
+                # PreventUpdate, or a combination the chart cannot draw
+                pass
+    return count
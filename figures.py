@@ -0,0 +1,185 @@
+"""px.line and px.bar without plotly.express on every request.
+
+plotly.express checks every argument, groups the frame with pandas and
+validates each trace and layout property as it is set; for the small slices
+the callbacks draw, that is most of a request. `line` and `bar` take the
+arguments the charts use (x, y, color, facet_col, labels) and return the
+same figure, built from a Template: what plotly.express gives for a probe
+frame of one row per facet, kept as plain dicts. Only the grouping of the
+rows (numpy) and each trace's arrays, name and color are left per request.
+
+The figures have the update methods the charts call, without validation,
+and serialize like a go.Figure (to_plotly_json). With
+CEPAL_FIGURE_TEMPLATES=0, `line` and `bar` are px.line and px.bar.
+"""
+import functools
+import importlib
+import os
+import re
+import threading
+
+import numpy
+import pandas as pd
+from plotly.colors import qualitative
+
+ENABLED = os.environ.get('CEPAL_FIGURE_TEMPLATES', '1') != '0'
+
+# The color value in the probe frame, replaced by the real one in the trace strings
+PLACEHOLDER = '\x00color\x00'
+
+
+_express = None
+_express_lock = threading.Lock()
+
+
+def express():
+    # Imported on first use, by one thread: the others wait for the whole
+    # module instead of seeing it half executed
+    global _express
+    if _express is None:
+        with _express_lock:
+            if _express is None:
+                _express = importlib.import_module('plotly.express')
+    return _express
+
+
+def merged(base, updates):
+    """A copy of `base` with `updates` applied as plotly's update methods do:
+    dicts merge into dicts, a string title is the title's text."""
+    result = dict(base)
+    for key, value in updates.items():
+        if key == 'title' and isinstance(value, str):
+            value = {'text': value}
+        current = result.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            value = merged(current, value)
+        result[key] = value
+    return result
+
+
+def properties(kwargs):
+    # Magic underscores: title_text=... is title=dict(text=...)
+    updates = {}
+    for key, value in kwargs.items():
+        first, *rest = key.split('_')
+        for part in reversed(rest):
+            value = {part: value}
+        updates = merged(updates, {first: value})
+    return updates
+
+
+class Figure:
+    """A figure as the dicts a go.Figure serializes to."""
+
+    def __init__(self, data, layout):
+        self.data = data
+        self.layout = layout
+
+    def update_layout(self, **kwargs):
+        self.layout = merged(self.layout, properties(kwargs))
+        return self
+
+    def update_traces(self, **kwargs):
+        updates = properties(kwargs)
+        self.data = [merged(trace, updates) for trace in self.data]
+        return self
+
+    def update_xaxes(self, **kwargs):
+        return self.update_axes('xaxis', kwargs)
+
+    def update_yaxes(self, **kwargs):
+        return self.update_axes('yaxis', kwargs)
+
+    def update_axes(self, prefix, kwargs):
+        updates = properties(kwargs)
+        for key in list(self.layout):
+            if re.fullmatch(prefix + r'\d*', key):
+                self.layout = merged(self.layout, {key: updates})
+        return self
+
+    def to_plotly_json(self):
+        return {'data': self.data, 'layout': self.layout}
+
+
+class Template:
+    """The layout of a px chart and, per facet, its first trace."""
+
+    def __init__(self, kind, x, y, color, facet_col, facets, labels):
+        rows = max(len(facets), 1)
+        probe = {x: [0] * rows, y: [0.0] * rows}
+        if color:
+            probe[color] = [PLACEHOLDER] * rows
+        if facet_col:
+            probe[facet_col] = list(facets)
+        figure = getattr(express(), kind)(pd.DataFrame(probe), x=x, y=y, color=color,
+                                          facet_col=facet_col, labels=labels)
+        self.colors = list(figure.layout.template.layout.colorway or qualitative.D3)
+        self.color_key = 'line' if kind == 'line' else 'marker'
+        plain = figure.to_plotly_json()
+        self.layout = plain['layout']
+        self.traces = plain['data']
+        self.legend = self.traces[0]['showlegend']
+
+    def trace(self, facet, value, color, x, y, first):
+        skeleton = self.traces[facet]
+        trace = {key: v.replace(PLACEHOLDER, value) if isinstance(v, str) else v
+                 for key, v in skeleton.items()}
+        trace[self.color_key] = dict(skeleton[self.color_key], color=color)
+        trace['x'] = x
+        trace['y'] = y
+        if self.legend:
+            # In the legend once per color, on its first trace
+            trace['showlegend'] = first
+        return trace
+
+
+@functools.lru_cache(maxsize=128)
+def template(kind, x, y, color, facet_col, facets, labels):
+    return Template(kind, x, y, color, facet_col, facets, dict(labels))
+
+
+def factorize(frame, column):
+    # Codes in order of first appearance, the order of px's traces
+    if column is None:
+        return numpy.zeros(len(frame), dtype=int), [None]
+    codes, uniques = pd.factorize(frame[column])
+    if (codes < 0).any():
+        # px fails on missing values as well
+        raise KeyError(column)
+    return codes, list(uniques)
+
+
+def build(kind, frame, x, y, color=None, facet_col=None, labels=None):
+    if not ENABLED or (color and pd.api.types.is_numeric_dtype(frame[color])):
+        # Numeric colors are a continuous scale in px; not templated
+        return getattr(express(), kind)(frame, x=x, y=y, color=color, facet_col=facet_col, labels=labels)
+    if not len(frame) and (color or facet_col):
+        raise KeyError(facet_col or color)
+    colors, color_values = factorize(frame, color)
+    facets, facet_values = factorize(frame, facet_col)
+    spec = template(kind, x, y, color, facet_col, tuple(facet_values) if facet_col else (),
+                    tuple(sorted((labels or {}).items())))
+
+    # One trace per (color, facet), rows in frame order
+    keys = colors * len(facet_values) + facets
+    order = numpy.argsort(keys, kind='stable')
+    keys = keys[order]
+    bounds = numpy.flatnonzero(numpy.diff(keys)) + 1
+    xs = numpy.split(frame[x].to_numpy()[order], bounds)
+    ys = numpy.split(frame[y].to_numpy()[order], bounds)
+    data = []
+    seen = set()
+    for key, trace_x, trace_y in zip(keys[numpy.r_[0, bounds]] if len(keys) else [], xs, ys):
+        c, f = divmod(int(key), len(facet_values))
+        value = '' if color is None else str(color_values[c])
+        data.append(spec.trace(f, value, spec.colors[c % len(spec.colors)], trace_x, trace_y, c not in seen))
+        seen.add(c)
+    return Figure(data, spec.layout)
+
+
+def line(frame, x, y, color=None, facet_col=None, labels=None):
+    return build('line', frame, x, y, color, facet_col, labels)
+
+
+def bar(frame, x, y, color=None, facet_col=None, labels=None):
+    return build('bar', frame, x, y, color, facet_col, labels)
@@ -0,0 +1,19 @@
+"""gunicorn settings, read from the working directory.
+
+With --preload the app is imported once, in the master process. when_ready
+then also loads every indicator, view and plotly.express there and freezes
+the garbage collector, so the forked workers share those pages
+copy-on-write instead of each loading its own copy:
+
+    gunicorn app_graphs:server --threads 4 --preload
+"""
+import gc
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    import app_graphs
+    app_graphs.preload()
+    # The collector would otherwise write to every shared object header
+    gc.freeze()
@@ -0,0 +1,122 @@
+"""Row index over the dimension columns of each indicator frame.
+
+Built once per dataset (see dataset.py). For every dimension column (the categoricals plus
+Años) the row positions of each value are kept as one stably sorted array,
+so the rows for a value are a contiguous range of it. A lookup starts from
+the shortest range among the filters and checks the remaining filters on
+those rows only, which keeps callbacks independent of the frame size:
+
+    index.slice('gini', pais='Chile', area='Nacional')
+    index.slice('tamano_hogar', pais='Chile', anio=[2002, 2010])
+"""
+import numpy
+import pandas as pd
+
+import schema
+
+# Keyword shortcuts for column names that are not valid identifiers
+aliases = {'pais': 'País',
+           'area': 'Área geográfica',
+           'quintil': 'Quintil',
+           'sexo': 'Sexo',
+           'anio': 'Años',
+           'escolaridad': 'Escolaridad (EH)'}
+
+# Categorical columns that are never filtered on
+skip = {'ids_notas'}
+
+_indexes = {}
+
+
+def is_multi(value):
+    return isinstance(value, (list, tuple, set, numpy.ndarray, pd.Index))
+
+
+class FrameIndex:
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.codes = {}
+        self.lookup = {}
+        self.ranges = {}
+        for col in frame.columns:
+            if col == 'Años' or (schema.is_categorical(frame[col]) and col not in skip):
+                self.add(col)
+
+    def add(self, col):
+        codes, uniques = pd.factorize(self.frame[col])
+        order = numpy.argsort(codes, kind='stable')
+        counts = numpy.bincount(codes[codes >= 0], minlength=len(uniques))
+        # Missing values (code -1) sort first, skip over them
+        bounds = numpy.concatenate([[0], numpy.cumsum(counts)]) + (codes < 0).sum()
+        self.codes[col] = codes
+        self.lookup[col] = {value: i for i, value in enumerate(uniques)}
+        self.ranges[col] = [order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))]
+
+    def column(self, key):
+        col = aliases.get(key, key)
+        if col not in self.lookup:
+            raise KeyError(col)
+        return col
+
+    def codes_for(self, col, value):
+        values = value if is_multi(value) else [value]
+        return [self.lookup[col][v] for v in values if v in self.lookup[col]]
+
+    def positions(self, **filters):
+        wanted = {}
+        for key, value in filters.items():
+            col = self.column(key)
+            wanted[col] = self.codes_for(col, value)
+        if not wanted:
+            return numpy.arange(len(self.frame))
+
+        # Start from the filter that matches the fewest rows
+        sizes = {col: sum(len(self.ranges[col][c]) for c in codes) for col, codes in wanted.items()}
+        first = min(sizes, key=sizes.get)
+        rows = [self.ranges[first][c] for c in wanted.pop(first)]
+        rows = rows[0] if len(rows) == 1 else numpy.sort(numpy.concatenate(rows or [[]])).astype('int64')
+
+        for col, codes in wanted.items():
+            if len(rows) == 0:
+                break
+            if len(codes) == 1:
+                rows = rows[self.codes[col][rows] == codes[0]]
+            else:
+                rows = rows[numpy.isin(self.codes[col][rows], codes)]
+        return rows
+
+    def take(self, **filters):
+        return self.frame.take(self.positions(**filters))
+
+    def values(self, key, **filters):
+        col = self.column(key)
+        uniques = list(self.lookup[col])
+        if not filters:
+            return numpy.array(uniques)
+        # Read the codes of the matching rows instead of taking them
+        codes = pd.unique(self.codes[col][self.positions(**filters)])
+        return numpy.array([uniques[c] for c in codes if c >= 0])
+
+
+def use(indexes):
+    # Point the module-level lookups at one dataset's indexes. A single
+    # assignment, so threads see either the old or the new set, never a mix.
+    global _indexes
+    _indexes = indexes
+
+
+def slice(indicator, **filters):
+    """Rows of `indicator` matching every filter, in their original order.
+
+    Filters are column names (or the keys in `aliases`) mapped to a value or
+    a list of accepted values. Unknown values match nothing; an unknown
+    column raises KeyError, like indexing the frame would.
+    """
+    return _indexes[indicator].take(**filters)
+
+
+def values(indicator, column, **filters):
+    """Distinct values of an indexed column (among the rows matching
+    `filters`), in order of first appearance."""
+    return _indexes[indicator].values(column, **filters)
@@ -0,0 +1,123 @@
+"""Convert many indicator sources into the store in parallel, with a manifest.
+
+    python ingest.py [-j JOBS] [--all] [NAME ...]
+
+Every indicator (a CSV or a CEPALSTAT XML export, see store.py) is read,
+typed and validated (schema.validate) by a pool of JOBS processes (default:
+one per CPU) and written into the store. Indicators whose store version
+exists already, i.e. whose source checksum has not changed, are skipped.
+
+STORE_DIR/manifest.json then lists, for every indicator ingested so far, its
+source file, checksum, store directory, row count, years and countries.
+Stale store versions of the ingested indicators are dropped.
+
+NAME defaults to the app's indicators (store.sources); --all adds every
+other .csv and .xml file in DATA_DIR, named after the file. The exit status
+is 1 when some indicator failed.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import tempfile
+import time
+
+import schema
+import store
+
+MANIFEST = os.path.join(store.STORE_DIR, 'manifest.json')
+
+
+def discover():
+    # Files in DATA_DIR that no entry of store.sources names (nor its export)
+    known = {os.path.splitext(filename)[0] for filename in store.sources.values()}
+    found = []
+    for filename in sorted(os.listdir(store.DATA_DIR)):
+        stem, ext = os.path.splitext(filename)
+        if ext in ('.csv', '.xml') and stem not in known and stem not in found:
+            found.append(stem)
+    return found
+
+
+def convert(name):
+    """Bring one indicator's store version up to date (in a pool process).
+
+    Returns (name, digest, seconds), seconds being None when it was current.
+    """
+    start = time.perf_counter()
+    digest = store.source_checksum(name)
+    if os.path.isdir(store.version_dir(name, digest)):
+        return name, digest, None
+    df, metadata = store.read_source(name)
+    schema.validate(df)
+    store.write(name, digest, df, metadata)
+    return name, digest, time.perf_counter() - start
+
+
+def describe(name, digest):
+    path = store.version_dir(name, digest)
+    meta = store.read_meta(path)
+    uniques = {entry['name']: entry['uniques'] for entry in meta['columns'] if 'uniques' in entry}
+    return {'source': meta['source'],
+            'checksum': digest,
+            'store': os.path.basename(path),
+            'rows': meta['rows'],
+            'years': sorted(uniques.get('Años', [])),
+            'countries': sorted(uniques.get('País', []))}
+
+
+def read_manifest(path=MANIFEST):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest, path=MANIFEST):
+    # Replaced in one step, so readers never see half of it
+    fd, tmp = tempfile.mkstemp(prefix='.manifest-', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', metavar='NAME')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--all', action='store_true', help='also every other source file in DATA_DIR')
+    opts = parser.parse_args()
+
+    names = opts.names or list(store.sources)
+    if opts.all:
+        names += [name for name in discover() if name not in names]
+    missing = [name for name in names if not os.path.exists(store.source_path(name))]
+    for name in missing:
+        print('{}: missing {}'.format(name, store.source_path(name)), file=sys.stderr)
+    names = [name for name in names if name not in missing]
+
+    os.makedirs(store.STORE_DIR, exist_ok=True)
+    manifest = read_manifest()
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=opts.jobs) as pool:
+        futures = {pool.submit(convert, name): name for name in names}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                name, digest, seconds = future.result()
+            except Exception as e:
+                print('{}: failed ({!r})'.format(name, e), file=sys.stderr)
+                failed += 1
+                continue
+            manifest[name] = describe(name, digest)
+            print('{}: {}'.format(name, 'unchanged' if seconds is None else
+                                  '{} rows in {:.2f} s'.format(manifest[name]['rows'], seconds)))
+    write_manifest(manifest)
+    store.prune([name for name in names if name in manifest])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""Per-callback timings and counters, served on /metrics in the Prometheus text format.
+
+Off unless CEPAL_METRICS is set to anything but 0; then nothing is wrapped
+and no route is added. When on, every server-side callback records:
+
+    cepal_callback_duration_seconds{callback, phase}   histogram, phase is
+        total      the whole request, figure cache included
+        filter     index.slice / index.values calls
+        build      the rest of the callback: pandas and plotly
+        serialize  Dash's validation and JSON encoding
+    cepal_callback_requests_total{callback}
+    cepal_callback_cache_hits_total{callback}          answered by the figure cache
+    cepal_callback_errors_total{callback, type}        raised to Dash (PreventUpdate included)
+    cepal_callback_swallowed_total{callback, type}     caught by the callback, see swallowed()
+
+Counters live in each process; with several gunicorn workers every scrape
+sees the worker that answered it.
+"""
+import bisect
+import collections
+import functools
+import os
+import threading
+import time
+
+import flask
+
+import index
+
+ENABLED = os.environ.get('CEPAL_METRICS', '').strip() not in ('', '0')
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(collections.Counter)
+        # (callback, phase) -> [bucket counts..., +Inf count, sum]
+        self.durations = {}
+
+    def count(self, name, labels, amount=1):
+        with self.lock:
+            self.counters[name][labels] += amount
+
+    def observe(self, callback_id, phases):
+        with self.lock:
+            for phase, seconds in phases.items():
+                entry = self.durations.get((callback_id, phase))
+                if entry is None:
+                    entry = self.durations[(callback_id, phase)] = [0] * (len(BUCKETS) + 1) + [0.0]
+                entry[bisect.bisect_left(BUCKETS, seconds)] += 1
+                entry[-1] += seconds
+
+    def render(self, cache=None):
+        lines = []
+        with self.lock:
+            lines += ['# HELP cepal_callback_duration_seconds Callback duration by phase.',
+                      '# TYPE cepal_callback_duration_seconds histogram']
+            for (callback_id, phase), entry in sorted(self.durations.items()):
+                labels = 'callback="{}",phase="{}"'.format(callback_id, phase)
+                total = 0
+                for bound, n in zip(BUCKETS + ('+Inf',), entry[:-1]):
+                    total += n
+                    lines.append('cepal_callback_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound, total))
+                lines.append('cepal_callback_duration_seconds_sum{{{}}} {:.6f}'.format(labels, entry[-1]))
+                lines.append('cepal_callback_duration_seconds_count{{{}}} {}'.format(labels, total))
+            for name, label_names, help_ in counters:
+                lines += ['# HELP {} {}'.format(name, help_), '# TYPE {} counter'.format(name)]
+                for labels, value in sorted(self.counters[name].items()):
+                    pairs = ','.join('{}="{}"'.format(k, v) for k, v in zip(label_names, labels))
+                    lines.append('{}{{{}}} {}'.format(name, pairs, value))
+        if cache is not None:
+            lines += ['# HELP cepal_figure_cache_lookups_total Figure cache lookups by result.',
+                      '# TYPE cepal_figure_cache_lookups_total counter']
+            for result, value in [('hit', cache.hits), ('shared_hit', cache.shared_hits), ('miss', cache.misses)]:
+                lines.append('cepal_figure_cache_lookups_total{{result="{}"}} {}'.format(result, value))
+        return '\n'.join(lines) + '\n'
+
+
+# Counter name, label names, help text
+counters = [('cepal_callback_requests_total', ('callback',), 'Callback requests.'),
+            ('cepal_callback_cache_hits_total', ('callback',), 'Requests answered by the figure cache.'),
+            ('cepal_callback_errors_total', ('callback', 'type'), 'Exceptions raised to Dash.'),
+            ('cepal_callback_swallowed_total', ('callback', 'type'), 'Exceptions caught by the callback.')]
+
+registry = Registry()
+
+
+def timed(func, phase):
+    # Add the time spent in `func` to the current request's `phase`
+    @functools.wraps(func)
+    def timed_call(*args, **kwargs):
+        record = getattr(_local, 'record', None)
+        if record is None:
+            # Outside a request: warming, benchmarks, tests
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record[phase] += time.perf_counter() - start
+    return timed_call
+
+
+def requested():
+    # A callback request, not a figure embedded in the layout, warming or a benchmark
+    return flask.has_request_context() and flask.request.path.endswith('_dash-update-component')
+
+
+def observed(callback_id, func):
+    def observed_call(*args, **kwargs):
+        # A section renders its figures inside its own callback: those are
+        # recorded on their own, and the section's record is restored after
+        outer = getattr(_local, 'record', None)
+        record = _local.record = {'callback': callback_id, 'filter': 0.0, 'function': 0.0}
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            registry.count('cepal_callback_errors_total', (callback_id, type(e).__name__))
+            raise
+        finally:
+            _local.record = outer
+            total = time.perf_counter() - start
+            if outer is None and requested():
+                registry.count('cepal_callback_requests_total', (callback_id,))
+            if record['function']:
+                registry.observe(callback_id, {'total': total,
+                                               'filter': record['filter'],
+                                               'build': record['function'] - record['filter'],
+                                               'serialize': total - record['function']})
+            else:
+                # The callback never ran: answered from the figure cache
+                registry.count('cepal_callback_cache_hits_total', (callback_id,))
+                registry.observe(callback_id, {'total': total})
+    observed_call.__wrapped__ = func
+    return observed_call
+
+
+def swallowed(exc):
+    """Count an exception a callback catches and answers with an empty figure."""
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        registry.count('cepal_callback_swallowed_total', (record['callback'], type(exc).__name__))
+
+
+def instrument(app):
+    """Time the callbacks registered on `app` from now on. Call before defining them."""
+    if not ENABLED:
+        return
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        wrap_func = register(*args, **kwargs)
+        return lambda func: wrap_func(timed(func, 'function'))
+
+    app.callback = callback
+    index.slice = timed(index.slice, 'filter')
+    index.values = timed(index.values, 'filter')
+
+
+def install(app, cache=None):
+    """Record every callback of `app` and serve the counters on /metrics."""
+    if not ENABLED:
+        return
+    for callback_id, spec in app.callback_map.items():
+        if 'callback' in spec:
+            spec['callback'] = observed(callback_id, spec['callback'])
+
+    @app.server.route('/metrics')
+    def serve_metrics():
+        return flask.Response(registry.render(cache), mimetype='text/plain; version=0.0.4')
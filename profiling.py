@@ -0,0 +1,186 @@
+"""Opt-in cProfile captures of callback executions, browsable at /_profiles.
+
+    CEPAL_PROFILE=1       profile every callback that runs
+    CEPAL_PROFILE=0.05    profile a random 5% of them
+    CEPAL_PROFILE=flag    profile only flagged requests
+    CEPAL_PROFILE=0       off, as when unset
+    CEPAL_PROFILE_DIR     where captures are written (default store/profiles)
+    CEPAL_PROFILE_KEEP    how many of the slowest captures to keep (default 200)
+    CEPAL_PROFILE_TOKEN   required to read /_profiles, as ?token=... or an
+                          Authorization: Bearer header
+
+In any mode, a request is flagged when the dashboard was opened with
+?profile=1 (dash-renderer's POSTs carry the page URL as Referer) or when
+the POST itself carries ?profile=1.
+
+Each capture is a .pstats file (for pstats, snakeviz, gprof2dot, ...) and
+a .json file with the callback id, its arguments and the duration, so a
+slow combination can be replayed with benchmarks/. Figure cache hits never
+reach the callback and are not profiled. Only one request is profiled at a
+time; others running meanwhile are served normally.
+
+Captures hold the arguments of real visitors' requests, and any visitor can
+flag theirs. /_profiles is therefore only served to requests carrying
+CEPAL_PROFILE_TOKEN when it is set, and otherwise to requests from the host
+itself; anyone else gets a 404. Behind a proxy on the same host every request looks
+local: set the token there.
+"""
+import cProfile
+import hmac
+import html
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import urllib.parse
+
+import flask
+
+import store
+
+DIRECTORY = os.environ.get('CEPAL_PROFILE_DIR', os.path.join(store.STORE_DIR, 'profiles'))
+KEEP = int(os.environ.get('CEPAL_PROFILE_KEEP', 200))
+TOKEN = os.environ.get('CEPAL_PROFILE_TOKEN', '')
+
+_lock = threading.Lock()
+
+
+def sample_rate(mode):
+    """Share of callbacks profiled for CEPAL_PROFILE=`mode`: None when off,
+    0.0 for flagged requests only."""
+    if not mode:
+        return None
+    if mode == 'flag':
+        return 0.0
+    try:
+        rate = float(mode)
+    except ValueError:
+        rate = None
+    if rate == 0:
+        return None
+    if rate is None or not 0 < rate <= 1:
+        raise ValueError('CEPAL_PROFILE must be flag or a number in (0, 1], not {!r}'.format(mode))
+    return rate
+
+
+RATE = sample_rate(os.environ.get('CEPAL_PROFILE', '').strip())
+
+
+def flagged():
+    if not flask.has_request_context():
+        return False
+    request = flask.request
+    if request.args.get('profile'):
+        return True
+    query = urllib.parse.urlsplit(request.referrer or '').query
+    return bool(urllib.parse.parse_qs(query).get('profile'))
+
+
+def allowed(token=TOKEN):
+    request = flask.request
+    if not token:
+        return request.remote_addr in ('127.0.0.1', '::1')
+    given = request.args.get('token') or request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+    return hmac.compare_digest(given.encode('utf-8'), token.encode('utf-8'))
+
+
+def captures(directory=DIRECTORY):
+    """Metadata of the captures in `directory`, slowest first."""
+    found = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, name), encoding='utf-8') as f:
+                    found.append(dict(json.load(f), name=name[:-5]))
+            except (OSError, ValueError):
+                # Being written or pruned by another worker
+                pass
+    return sorted(found, key=lambda c: c['seconds'], reverse=True)
+
+
+def save(profile, callback_id, args, seconds, directory=DIRECTORY, keep=KEEP):
+    os.makedirs(directory, exist_ok=True)
+    name = '{}-{}-{}'.format(callback_id, int(time.time() * 1000), os.getpid())
+    profile.dump_stats(os.path.join(directory, name + '.pstats'))
+    with open(os.path.join(directory, name + '.json'), 'w', encoding='utf-8') as f:
+        json.dump({'callback': callback_id, 'args': args, 'seconds': seconds,
+                   'time': time.strftime('%Y-%m-%d %H:%M:%S')}, f, ensure_ascii=False, default=repr)
+    # Keep the slowest captures only
+    for capture in captures(directory)[keep:]:
+        for ext in ('.json', '.pstats'):
+            try:
+                os.remove(os.path.join(directory, capture['name'] + ext))
+            except OSError:
+                pass
+
+
+def profiled(callback_id, func, rate):
+    def profiled_call(*args, **kwargs):
+        if not (flagged() or (rate and random.random() < rate)) or not _lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                save(profile, callback_id, list(args), time.perf_counter() - start)
+        finally:
+            _lock.release()
+    profiled_call.__wrapped__ = func
+    return profiled_call
+
+
+def index_page():
+    rows = []
+    for capture in captures()[:100]:
+        link = flask.url_for('profile_capture', name=capture['name'])
+        # The token, when the page was opened with one, carries over
+        query = '?' + urllib.parse.urlencode({'token': flask.request.args['token']}) if 'token' in flask.request.args else ''
+        rows.append('<tr><td>{:.1f}</td><td>{}</td><td>{}</td><td><code>{}</code></td>'
+                    '<td><a href="{}">stats</a> <a href="{}">.pstats</a></td></tr>'.format(
+                        capture['seconds'] * 1000, html.escape(capture['callback']), capture['time'],
+                        html.escape(json.dumps(capture['args'], ensure_ascii=False)[:200]),
+                        html.escape(link + query), html.escape(link + '.pstats' + query)))
+    return ('<html><head><title>Profiles</title></head><body><h1>Slowest callback captures</h1>'
+            '<table><tr><th>ms</th><th>callback</th><th>time</th><th>arguments</th><th></th></tr>'
+            '{}</table></body></html>'.format(''.join(rows)))
+
+
+def capture_page(name):
+    name = os.path.basename(name)
+    if name.endswith('.pstats'):
+        return flask.send_from_directory(DIRECTORY, name, as_attachment=True)
+    path = os.path.join(DIRECTORY, name + '.pstats')
+    if not os.path.exists(path):
+        flask.abort(404)
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats('cumulative').print_stats(60)
+    return flask.Response(out.getvalue(), mimetype='text/plain')
+
+
+def restricted(view):
+    def restricted_view(*args, **kwargs):
+        if not allowed():
+            flask.abort(404)
+        return view(*args, **kwargs)
+    return restricted_view
+
+
+def install(app):
+    """Profile the callbacks of `app` per CEPAL_PROFILE and serve /_profiles.
+
+    Call before figure_cache.install, so only callbacks that run are captured.
+    """
+    if RATE is None:
+        return
+    for callback_id, spec in app.callback_map.items():
+        if 'callback' in spec:
+            spec['callback'] = profiled(callback_id, spec['callback'], RATE)
+    app.server.add_url_rule('/_profiles', 'profile_index', restricted(index_page))
+    app.server.add_url_rule('/_profiles/<name>', 'profile_capture', restricted(capture_page))
@@ -0,0 +1,138 @@
+"""Reload the indicators whose CSV changed, while the app keeps serving.
+
+    CEPAL_REFRESH_INTERVAL=30    check the CSVs every 30 seconds (default 0: off)
+
+A background thread compares the size and modification time of every
+source file (CSVs and CEPALSTAT exports) with the previous check. Once a changed file has stopped changing, its
+checksum decides whether the indicator is new: only those indicators are
+converted into the store, the next Dataset (Dataset.successor) shares every
+other loaded indicator and view with the current one, and it is made
+current only once the changed ones are loaded. Requests are answered from
+the old dataset meanwhile. Every swap prints a row diff per indicator to
+stderr.
+
+The thread starts with the first request a process serves, so each gunicorn
+worker watches on its own and a --preload master never does.
+"""
+import os
+import sys
+import threading
+import time
+
+import dataset
+import schema
+import store
+import views
+
+INTERVAL = float(os.environ.get('CEPAL_REFRESH_INTERVAL', 0))
+
+# Columns that do not identify a row
+attributes = {'valor', 'id_fuente', 'ids_notas', 'iso3'}
+
+
+def stat(name):
+    # (mtime, size) of each file the indicator is built from
+    try:
+        return [(st.st_mtime_ns, st.st_size) for st in map(os.stat, store.source_files(name))]
+    except OSError:
+        return None
+
+
+def diff(old, new):
+    """Rows added, removed and with a new valor, matching rows on their dimensions."""
+    keys = [col for col in old.columns if col in new.columns and col not in attributes]
+    merged = schema.plain(old[keys + ['valor']]).merge(schema.plain(new[keys + ['valor']]),
+                                                       on=keys, how='outer', indicator=True)
+    both = merged[merged['_merge'] == 'both']
+    changed = both['valor_x'].ne(both['valor_y']) & ~(both['valor_x'].isna() & both['valor_y'].isna())
+    return {'rows': (len(old), len(new)),
+            'added': int((merged['_merge'] == 'right_only').sum()),
+            'removed': int((merged['_merge'] == 'left_only').sum()),
+            'changed': int(changed.sum())}
+
+
+class Refresher:
+
+    def __init__(self, on_swap, interval=INTERVAL):
+        self.on_swap = on_swap
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.generation = 0
+        # name -> stat() at the last check, and when its checksum was last taken
+        self.seen = {}
+        self.checked = {}
+        self.thread = None
+        self.pid = None
+        self.starting = threading.Lock()
+
+    def changes(self, current):
+        checksums = {}
+        for name in current.names:
+            now = stat(name)
+            settled = now is not None and now == self.seen.get(name)
+            self.seen[name] = now
+            if settled and now != self.checked.get(name):
+                self.checked[name] = now
+                digest = store.source_checksum(name)
+                if digest != current.checksums[name]:
+                    checksums[name] = digest
+        return checksums
+
+    def check(self):
+        """Swap in a new dataset if some CSVs changed. Returns the changed names."""
+        with self.lock:
+            current = dataset.current()
+            checksums = self.changes(current)
+            for name, digest in list(checksums.items()):
+                existed = os.path.isdir(store.version_dir(name, digest))
+                path = store.build(name, digest)
+                if not existed and stat(name) != self.seen[name]:
+                    # Written to again while converting: the next check retries
+                    store.remove_dir(path)
+                    self.checked.pop(name, None)
+                    del checksums[name]
+            if not checksums:
+                return []
+
+            new = current.successor(checksums)
+            for name in sorted(checksums):
+                d = diff(store.load(name, digest=current.checksums[name]), store.load(name, digest=checksums[name]))
+                print('refresh: {} {} -> {} rows, {} added, {} removed, {} changed'.format(
+                    name, d['rows'][0], d['rows'][1], d['added'], d['removed'], d['changed']), file=sys.stderr)
+            for name in sorted(checksums) + [v for v in new.view_names if views.specs[v][0] in checksums]:
+                new.entry(name)
+            self.on_swap(new)
+            self.generation += 1
+            print('refresh: serving dataset {} (generation {})'.format(new.version, self.generation),
+                  file=sys.stderr)
+            return sorted(checksums)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                # A half-written or malformed CSV: keep serving the current data
+                print('refresh: failed ({!r})'.format(e), file=sys.stderr)
+
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        with self.starting:
+            if self.pid != os.getpid():
+                self.thread = threading.Thread(target=self.run, name='cepal-refresh', daemon=True)
+                self.thread.start()
+                self.pid = os.getpid()
+
+
+def watch(server, on_swap, interval=INTERVAL):
+    """Check for changed CSVs every `interval` seconds once `server` (a Flask
+    app) serves its first request; `on_swap(dataset)` serves each new
+    dataset, making it current (dataset.activate) along with whatever else
+    must change with it. None when refreshing is off."""
+    if not interval:
+        return None
+    refresher = Refresher(on_swap, interval)
+    server.before_request(refresher.start)
+    return refresher
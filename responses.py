@@ -0,0 +1,96 @@
+"""Callback responses encoded with orjson instead of Dash's json.dumps.
+
+Dash serializes what a callback returns with json.dumps and plotly's
+PlotlyJSONEncoder: every NumPy array goes through tolist() and Python
+floats, with spaces after separators, and the whole document is parsed and
+encoded again whenever a NaN is in it. `install` replaces Dash's wrapper of
+each server callback with one building the same response and encoding it
+with orjson, which writes NumPy arrays natively and NaN as null.
+
+    CEPAL_ORJSON=0         keep Dash's encoder (also when orjson is missing)
+    CEPAL_ROUND_VALOR=1    round float arrays (the plotted valor) to the
+                           decimal places of the callback's indicators
+
+The wrapper sits below the figure cache, so cached responses are neither
+rebuilt nor encoded again. Outputs orjson cannot encode fall back to Dash's
+encoder, and with it to Dash's error reporting.
+"""
+import json
+import os
+
+import dash
+import numpy
+from dash.exceptions import PreventUpdate
+from plotly.utils import PlotlyJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENABLED = orjson is not None and os.environ.get('CEPAL_ORJSON', '1') != '0'
+ROUND = os.environ.get('CEPAL_ROUND_VALOR') == '1'
+
+NoUpdate = type(dash.no_update)
+
+
+def default(obj):
+    # What orjson does not encode itself: figures and components, object
+    # arrays (strings), non-contiguous arrays and NumPy scalars it lacks
+    if hasattr(obj, 'to_plotly_json'):
+        return obj.to_plotly_json()
+    if isinstance(obj, (numpy.ndarray, numpy.generic)):
+        return obj.tolist()
+    raise TypeError(type(obj).__name__)
+
+
+def rounding(places):
+    def round_default(obj):
+        if isinstance(obj, numpy.ndarray) and obj.dtype.kind == 'f':
+            return numpy.round(obj, places).tolist()
+        return default(obj)
+    return round_default
+
+
+def dumps(response, places=None):
+    """`response` as JSON text, with float arrays rounded to `places` decimals."""
+    if not ENABLED:
+        return json.dumps(response, cls=PlotlyJSONEncoder)
+    try:
+        if places is None:
+            return orjson.dumps(response, default=default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+        # Without native NumPy, every array reaches the default to be rounded
+        return orjson.dumps(response, default=rounding(places), option=orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        return json.dumps(response, cls=PlotlyJSONEncoder)
+
+
+def respond(callback_id, func, decimals=None):
+    """Dash's add_context for the single-output callback `callback_id`,
+    calling `func` and encoding with `dumps`. `decimals(callback_id)` gives
+    the places to round to when CEPAL_ROUND_VALOR is on."""
+    id_, prop = callback_id.rsplit('.', 1)
+
+    def respond_call(*args, **kwargs):
+        kwargs.pop('outputs_list', None)
+        value = func(*args, **kwargs)
+        if isinstance(value, NoUpdate):
+            raise PreventUpdate
+        places = decimals(callback_id) if ROUND and decimals is not None else None
+        return dumps({'response': {id_: {prop: value}}, 'multi': True}, places)
+    respond_call.__wrapped__ = func
+    return respond_call
+
+
+def install(app, decimals=None):
+    """Encode the responses of the app's single-output server callbacks with
+    `dumps`. Call before other wrappers (profiling, figure_cache, metrics)."""
+    if not ENABLED:
+        return
+    for callback_id, spec in app.callback_map.items():
+        if 'callback' not in spec or callback_id.startswith('..') or '{' in callback_id:
+            # Clientside, multi-output or pattern-matching: left to Dash
+            continue
+        spec['callback'] = respond(callback_id, spec['callback'].__wrapped__, decimals)
+
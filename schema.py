@@ -0,0 +1,92 @@
+"""Column types shared by every indicator frame.
+
+Text dimensions (País, Área geográfica, Quintil, Sexo, ...) become pandas
+Categoricals, so filters like df['País'] == country compare small integer
+codes. Dimensions listed in `orders` keep that display order; anything else
+gets its values sorted.
+"""
+import numpy
+import pandas as pd
+
+# Bump when the typing rules change so stored conversions are rebuilt
+VERSION = 2
+
+orders = {'Quintil': ['Quintil 1', 'Quintil 2', 'Quintil 3', 'Quintil 4', 'Quintil 5',
+                      'Total quintiles'],
+          'Área geográfica': ['Nacional', 'Urbana', 'Rural'],
+          'Sexo': ['Ambos sexos', 'Hombres', 'Mujeres'],
+          'Escolaridad (EH)': ['0 a 5 años', '6 a 9 años', '10 a 12 años', '13 años y más', 'Total']}
+
+# valor stays float64: float32 cannot hold the published decimals (0.53 -> 0.5299999713897705)
+numeric = {'Años': 'int16',
+           'valor': 'float64'}
+
+# Columns every indicator has
+required = ('País', 'Años', 'valor')
+
+# Code columns that pandas would otherwise guess as numbers
+text = {'ids_notas': str,
+        'iso3': str}
+
+
+def categories(name, values):
+    fixed = orders.get(name, [])
+    extra = sorted(v for v in pd.unique(values.dropna()) if v not in fixed)
+    return fixed + extra
+
+
+def categorize(name, values):
+    return pd.Categorical(values, categories=categories(name, values), ordered=name in orders)
+
+
+def apply(df):
+    """Return `df` with every column converted to its schema type."""
+    typed = {}
+    for col in df.columns:
+        if col in numeric:
+            typed[col] = df[col].astype(numeric[col])
+        elif is_categorical(df[col]):
+            typed[col] = df[col]
+        elif df[col].dtype == object or col in text:
+            typed[col] = categorize(col, df[col])
+        else:
+            typed[col] = df[col]
+    return pd.DataFrame(typed, columns=df.columns)
+
+
+def read_csv(path):
+    return apply(pd.read_csv(path, dtype=text))
+
+
+def validate(df):
+    """Raise ValueError if a typed frame cannot be served as an indicator."""
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        raise ValueError('missing columns: {}'.format(', '.join(missing)))
+    if df['País'].isna().any():
+        raise ValueError('{} rows without País'.format(int(df['País'].isna().sum())))
+    return df
+
+
+def decimals(values, most=10):
+    """Decimal places the values were published with (float64 noise such as
+    0.0016625000000000001 aside), or None beyond `most`."""
+    values = numpy.asarray(values, dtype='float64')
+    values = values[numpy.isfinite(values)]
+    for places in range(most + 1):
+        if numpy.allclose(numpy.round(values, places), values, rtol=1e-12, atol=0):
+            return places
+    return None
+
+
+def is_categorical(values):
+    return isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def plain(df):
+    """Decode the categorical columns of a (small) slice back to strings.
+
+    plotly.express groups with observed=False, which would yield empty
+    traces for every unused category.
+    """
+    return df.astype({col: object for col in df.columns if is_categorical(df[col])})
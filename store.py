@@ -0,0 +1,255 @@
+"""Columnar binary store for the indicator CSVs under Databases/.
+
+The CSVs stay the source of truth. Each one is typed with schema.py and
+converted into a directory of .npy column files named after the CSV checksum
+and schema version, so a stale store is never read and rebuilding is just
+converting again. An indicator can also come from a CEPALSTAT XML export
+(cepalstat.py); the indicator metadata of the export (unit, notes,
+definition, sources) is kept in meta.json. So is the metadata of the export
+a CSV was made from, when that file is kept next to it or at the repo root:
+
+    python store.py            # convert every indicator, drop stale versions
+    python ingest.py -j 4      # the same with 4 processes, plus a manifest
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import numpy
+import pandas as pd
+
+import cepalstat
+import schema
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get('CEPAL_DATA_DIR', os.path.join(BASE_DIR, 'Databases'))
+STORE_DIR = os.environ.get('CEPAL_STORE_DIR', os.path.join(BASE_DIR, 'store'))
+
+# Indicator name -> CSV file in DATA_DIR
+sources = {'tamano_hogar': 'Tamano_medio_hogares.csv',
+           'mujeres_labor_hogar_AG_quintiles': 'mujeres_labor_hogar_AG_quintiles.csv',
+           'tasa_de_participacion_economica': 'tasa_de_participacion_economica.csv',
+           'tasa_de_participacion_economica_quintil': 'tasa_de_participacion_economica_quintil.csv',
+           'relacion_ingreso_medio_sexo': 'relacion_ingreso_medio_sexo.csv',
+           'ocupados_informal_sexo': 'ocupados_informal_sexo.csv',
+           'gini': 'gini.csv',
+           'poblacion_adulta_escolaridad': 'poblacion_adulta_escolaridad.csv',
+           'hogares_disponibilidad_servicios': 'hogares_disponibilidad_servicios.csv',
+           'tasa_victimizacion': 'tasa_victimizacion.csv',
+           'relacion_quintil_5_1': 'relacion_quintil_5_1.csv',
+           'asistencia_escolar_quintil': 'asistencia_escolar_quintil.csv',
+           'acceso_electricidad_quintil': 'acceso_electricidad_quintil.csv'}
+
+
+def source_path(name):
+    if name in sources:
+        return os.path.join(DATA_DIR, sources[name])
+    path = os.path.join(DATA_DIR, '{}.csv'.format(name))
+    xml_path = os.path.join(DATA_DIR, '{}.xml'.format(name))
+    return xml_path if not os.path.exists(path) and os.path.exists(xml_path) else path
+
+
+def export_path(name):
+    # The CEPALSTAT export a CSV was made from (the notebook reads them from the repo root)
+    path = source_path(name)
+    if path.endswith('.xml'):
+        return None
+    filename = os.path.splitext(os.path.basename(path))[0] + '.xml'
+    for directory in (DATA_DIR, BASE_DIR):
+        if os.path.exists(os.path.join(directory, filename)):
+            return os.path.join(directory, filename)
+    return None
+
+
+def source_files(name):
+    return [path for path in (source_path(name), export_path(name)) if path is not None]
+
+
+def checksum(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_checksum(name):
+    """Checksum of the files an indicator is built from."""
+    paths = source_files(name)
+    if len(paths) == 1:
+        return checksum(paths[0])
+    return hashlib.sha1(' '.join(checksum(path) for path in paths).encode()).hexdigest()
+
+
+def read_source(name):
+    """The typed frame of an indicator and its CEPALSTAT metadata ({} if none)."""
+    path = source_path(name)
+    if path.endswith('.xml'):
+        return cepalstat.read(path)
+    export = export_path(name)
+    return schema.read_csv(path), cepalstat.read_metadata(export) if export else {}
+
+
+def version_dir(name, digest):
+    return os.path.join(STORE_DIR, '{}-{}-s{}'.format(name, digest[:16], schema.VERSION))
+
+
+def write_columns(df, path, meta):
+    # One .npy file per column. Categorical columns are stored as their
+    # integer codes, with the category list kept in meta.json (-1 = missing).
+    # Dimension columns also list their distinct values in order of first
+    # appearance, so dropdowns can be filled without loading the data.
+    columns = []
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        entry = {'name': col, 'file': '{}.npy'.format(i)}
+        if schema.is_categorical(values):
+            codes = values.cat.codes.to_numpy()
+            entry['categories'] = list(values.cat.categories)
+            entry['ordered'] = bool(values.cat.ordered)
+            entry['uniques'] = [entry['categories'][c] for c in pd.unique(codes) if c >= 0]
+            numpy.save(os.path.join(path, entry['file']), codes)
+        else:
+            if col in schema.numeric and values.dtype.kind == 'i':
+                entry['uniques'] = [int(v) for v in pd.unique(values)]
+            numpy.save(os.path.join(path, entry['file']), values.to_numpy())
+        columns.append(entry)
+    meta = dict(meta, rows=len(df), columns=columns)
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+
+def read_meta(path):
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_columns(path, columns=None):
+    # `columns` limits the read to those columns, when present
+    meta = read_meta(path)
+    entries = [entry for entry in meta['columns'] if columns is None or entry['name'] in columns]
+    data = {}
+    for entry in entries:
+        values = numpy.load(os.path.join(path, entry['file']))
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, entry['categories'], ordered=entry['ordered'])
+        data[entry['name']] = values
+    return pd.DataFrame(data, columns=[entry['name'] for entry in entries])
+
+
+def build(name, digest=None):
+    """Convert one indicator source into the store and return its directory."""
+    digest = digest or source_checksum(name)
+    final = version_dir(name, digest)
+    if os.path.isdir(final):
+        return final
+    df, metadata = read_source(name)
+    return write(name, digest, df, metadata)
+
+
+def write(name, digest, df, metadata):
+    """Store the typed frame of an indicator read from the source with `digest`."""
+    final = version_dir(name, digest)
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.{}-'.format(name), dir=STORE_DIR)
+    write_columns(df, tmp, {'indicator': name,
+                            'source': os.path.basename(source_path(name)),
+                            'checksum': digest,
+                            'metadata': metadata})
+    try:
+        os.rename(tmp, final)
+    except OSError:
+        # Another worker finished the same version first
+        remove_dir(tmp)
+    return final
+
+
+def remove_dir(path):
+    for f in os.listdir(path):
+        os.remove(os.path.join(path, f))
+    os.rmdir(path)
+
+
+def load(name, columns=None, digest=None):
+    """Load an indicator (or some of its `columns`) from the store,
+    converting its source first if needed. `digest` is its source_checksum,
+    when already known."""
+    digest = digest or source_checksum(name)
+    path = version_dir(name, digest)
+    if not os.path.isdir(path):
+        try:
+            path = build(name, digest)
+        except OSError as e:
+            # Read-only deploy: fall back to parsing the source
+            print('store: cannot write {} ({}), reading {}'.format(path, e, source_path(name)), file=sys.stderr)
+            df = read_source(name)[0]
+            return df if columns is None else df[[col for col in df.columns if col in columns]]
+    return read_columns(path, columns)
+
+
+def stored(name, digest=None):
+    # The store directory of an indicator, converted if needed; None when the store cannot be written
+    path = version_dir(name, digest or source_checksum(name))
+    try:
+        return path if os.path.isdir(path) else build(name, digest)
+    except OSError:
+        return None
+
+
+def uniques(name, digest=None):
+    """Column -> distinct values of an indicator's dimension columns, from
+    the store metadata. None when the store cannot be written."""
+    path = stored(name, digest)
+    if path is None:
+        return None
+    return {entry['name']: entry['uniques'] for entry in read_meta(path)['columns'] if 'uniques' in entry}
+
+
+def describe(name, digest=None):
+    """CEPALSTAT metadata of an indicator (indicador, unidad, nota,
+    definicion, notas, fuentes, ...); {} when it comes without any."""
+    path = stored(name, digest)
+    if path is not None:
+        return read_meta(path).get('metadata', {})
+    export = export_path(name) or source_path(name)
+    return cepalstat.read_metadata(export) if export.endswith('.xml') else {}
+
+
+def load_all(names):
+    return {name: load(name) for name in names}
+
+
+def checksums(names):
+    return {name: source_checksum(name) for name in names}
+
+
+def version(names, digests=None):
+    # Identifies the dataset the app serves; changes with any CSV or the schema
+    digests = digests or checksums(names)
+    digest = hashlib.sha1('schema {}'.format(schema.VERSION).encode())
+    for name in names:
+        digest.update(digests[name].encode())
+    return digest.hexdigest()[:16]
+
+
+def prune(names):
+    # Drop store versions that no longer match their CSV
+    current = {os.path.basename(version_dir(n, source_checksum(n))) for n in names
+               if os.path.exists(source_path(n))}
+    for entry in os.listdir(STORE_DIR):
+        path = os.path.join(STORE_DIR, entry)
+        if entry.split('-', 1)[0] in names and entry not in current:
+            remove_dir(path)
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(sources)
+    for name in names:
+        if not os.path.exists(source_path(name)):
+            print('{}: missing {}'.format(name, source_path(name)), file=sys.stderr)
+            continue
+        print('{}: {}'.format(name, build(name)))
+    if os.path.isdir(STORE_DIR):
+        prune(names)
@@ -0,0 +1,163 @@
+"""Aggregate tables built once per dataset instead of once per request.
+
+Each view is a small typed frame derived from one indicator, declared in
+`specs` as (indicator, builder, keyword arguments). The builders cover the
+rollups the charts use:
+
+    initial_final   first and last observed year and value per group
+    latest_year     rows of each group's most recent year
+    fixed_years     rows of a fixed set of years
+
+The Dataset loads and indexes views like any indicator, on first use, so
+callbacks look them up with index.slice('<view name>', ...). Views are
+saved in the store under the dataset version and a digest of `specs`, so a
+worker only computes them when the data or a declaration changed. Workers
+swap datasets on their own, so the views of other versions are only removed
+once unused for CEPAL_VIEWS_KEEP seconds (default a day).
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+import pandas as pd
+
+import schema
+import store
+
+KEEP_SECONDS = float(os.environ.get('CEPAL_VIEWS_KEEP', 24 * 3600))
+
+
+def keep_dtypes(table, frame, columns):
+    # Keep the key columns categorical so the view can be indexed
+    for col in columns:
+        table[col] = table[col].astype(frame[col].dtype)
+    return table
+
+
+def initial_final(frame, by, value='Valor', flag=('Tendencia', 'Incremento', 'Decremento')):
+    """First and last observed year and value of each `by` group.
+
+    `flag` names a column marking whether the final value is at least the
+    initial one (second entry) or lower (third entry).
+    """
+    rows = frame.dropna(subset=['valor']).sort_values('Años', kind='mergesort')
+    table = rows.groupby(by, observed=True, sort=True).agg(**{
+        'Año - Inicial': ('Años', 'first'),
+        'Año - Final': ('Años', 'last'),
+        value + ' - Inicial': ('valor', 'first'),
+        value + ' - Final': ('valor', 'last')}).reset_index()
+    # groupby(sort=True) does not sort observed categorical groups reliably
+    table = table.sort_values(by, kind='mergesort', ignore_index=True)
+    column, up, down = flag
+    increased = table[value + ' - Final'] >= table[value + ' - Inicial']
+    table[column] = schema.categorize(column, pd.Series(numpy.where(increased, up, down)))
+    return keep_dtypes(table, frame, by)
+
+
+def latest_year(frame, by):
+    """Rows of the most recent year of each `by` group, in source order."""
+    last = frame.groupby(by, observed=True)['Años'].transform('max')
+    return frame[frame['Años'] == last].reset_index(drop=True)
+
+
+def fixed_years(frame, years):
+    return frame[frame['Años'].isin(years)].reset_index(drop=True)
+
+
+# View name -> (indicator, builder, keyword arguments)
+specs = {'gini_inicial_final': ('gini', initial_final,
+                                {'by': ['País', 'País (ISO)', 'Área geográfica'],
+                                 'value': 'Gini',
+                                 'flag': ('Desigualdad', 'Incremento en Desigualdad', 'Decremento en Desigualdad')}),
+         'tasa_de_participacion_economica_ultimo_anio': ('tasa_de_participacion_economica', latest_year,
+                                                         {'by': ['País']}),
+         'tasa_de_participacion_economica_quintil_ultimo_anio': ('tasa_de_participacion_economica_quintil',
+                                                                 latest_year, {'by': ['País']}),
+         'relacion_ingreso_medio_sexo_anios_observados': ('relacion_ingreso_medio_sexo', fixed_years,
+                                                          {'years': [2002, 2010, 2018]})}
+
+
+def digest():
+    # Changes with any declaration, so saved views are never stale
+    declared = [(name, indicator, builder.__name__, sorted(kwargs.items()))
+                for name, (indicator, builder, kwargs) in sorted(specs.items())]
+    return hashlib.sha1(repr(declared).encode('utf-8')).hexdigest()[:16]
+
+
+def directory(version):
+    return os.path.join(store.STORE_DIR, 'views-{}-{}'.format(version, digest()))
+
+
+def materialize(name, frames, version):
+    """View `name` of dataset `version`, read from the store or built from
+    `frames` (any mapping of indicator frames) and saved."""
+    root = directory(version)
+    path = os.path.join(root, name)
+    if os.path.isdir(path):
+        try:
+            table = store.read_columns(path)
+            used(root)
+            return table
+        except FileNotFoundError:
+            # Pruned meanwhile by a worker serving another version: built again
+            pass
+
+    indicator, builder, kwargs = specs[name]
+    table = builder(frames[indicator], **kwargs)
+    try:
+        save(name, table, version)
+    except OSError as e:
+        # Read-only deploy: keep the view in memory only
+        print('views: cannot write {} ({})'.format(path, e), file=sys.stderr)
+    return table
+
+
+def save(name, table, version):
+    root = directory(version)
+    if not os.path.isdir(root):
+        os.makedirs(root, exist_ok=True)
+        prune(root)
+    tmp = tempfile.mkdtemp(prefix='.{}-'.format(name), dir=root)
+    store.write_columns(table, tmp, {'view': name})
+    try:
+        os.rename(tmp, os.path.join(root, name))
+    except OSError:
+        # Another worker saved the same view first
+        store.remove_dir(tmp)
+
+
+def used(root):
+    # The mtime of a views directory is its last use, for prune()
+    try:
+        os.utime(root)
+    except OSError:
+        pass
+
+
+def prune(root):
+    # Other workers may still serve the views of another dataset version
+    # (or declaration); only those unused for KEEP_SECONDS are dropped
+    cutoff = time.time() - KEEP_SECONDS
+    for entry in os.listdir(store.STORE_DIR):
+        old = os.path.join(store.STORE_DIR, entry)
+        if not entry.startswith('views-') or old == root:
+            continue
+        try:
+            stale = os.path.getmtime(old) < cutoff
+        except OSError:
+            continue
+        if stale:
+            remove(old)
+
+
+def remove(path):
+    try:
+        for name in os.listdir(path):
+            store.remove_dir(os.path.join(path, name))
+        os.rmdir(path)
+    except OSError:
+        # Already removed by another worker
+        pass